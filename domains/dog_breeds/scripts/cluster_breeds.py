@@ -4,24 +4,40 @@ Cluster dog breeds by their feature vectors to find similar/different groups.
 """
 
 import json
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+import heapq
 import math
+import os
+import pickle
+import re
 
 SCRIPT_DIR = Path(__file__).parent
 DOMAIN_DIR = SCRIPT_DIR.parent
 
+# Packed breed matrix, rebuilt whenever fuzzy/*.json files change
+MATRIX_CACHE = DOMAIN_DIR / "cache" / "breed_matrix.pickle"
+
+# Feature reference in a need formula, with optional negation prefix
+_FEATURE_RE = re.compile(r"(~?)([a-z_]+)")
+
+
+def _read_json(path: Path) -> dict:
+    return json.loads(path.read_bytes())
+
 
 def load_breeds() -> dict[str, dict]:
     """Load all breed fuzzy data."""
     fuzzy_dir = DOMAIN_DIR / "fuzzy"
-    breeds = {}
 
-    for fpath in fuzzy_dir.glob("*.json"):
-        with open(fpath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        breeds[data["breed_id"]] = data
+    # Overlap file reads across threads; map() keeps glob order
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(_read_json, fuzzy_dir.glob("*.json")))
 
-    return breeds
+    return {data["breed_id"]: data for data in results}
 
 
 def load_breed_names() -> dict[str, str]:
@@ -32,113 +48,161 @@ def load_breed_names() -> dict[str, str]:
     return {b["id"]: b.get("name_ru") or b["name_en"] for b in data["breeds"]}
 
 
-def breed_to_vector(breed_data: dict) -> list[float]:
-    """Convert breed data to feature vector using (t - f) as value."""
-    vector = []
+CATEGORY_GROUPS = ("size_group", "height_group", "lifespan_group")
+
+
+def feature_order(breed_data: dict) -> tuple[list[str], list[tuple[str, list[str]]]]:
+    """Get sorted feature ids and (group_id, sorted category ids) for vector layout."""
+    feat_ids = sorted(breed_data.get("features", {}))
+    categories = breed_data.get("categories", {})
+    group_cats = [
+        (group_id, sorted(categories.get(group_id, {}).get("values", {})))
+        for group_id in CATEGORY_GROUPS
+    ]
+    return feat_ids, group_cats
+
 
-    # Features
-    for feat_id, feat_data in sorted(breed_data.get("features", {}).items()):
-        # Use t - f as the effective value (-1 to +1 range)
-        value = feat_data["t"] - feat_data["f"]
-        vector.append(value)
+def breed_to_vector(breed_data: dict, order: tuple | None = None) -> list[float]:
+    """Convert breed data to feature vector using (t - f) as value.
+
+    Pass a precomputed feature_order() to skip sorting keys for every breed.
+    """
+    feat_ids, group_cats = order or feature_order(breed_data)
+
+    # Features: t - f as the effective value (-1 to +1 range)
+    features = breed_data.get("features", {})
+    vector = [features[f]["t"] - features[f]["f"] for f in feat_ids]
 
     # Categories (size, height, lifespan)
-    for group_id in ["size_group", "height_group", "lifespan_group"]:
-        group = breed_data.get("categories", {}).get(group_id, {})
-        for cat_id, cat_data in sorted(group.get("values", {}).items()):
-            value = cat_data["t"] - cat_data["f"]
-            vector.append(value)
+    categories = breed_data.get("categories", {})
+    for group_id, cat_ids in group_cats:
+        values = categories.get(group_id, {}).get("values", {})
+        vector.extend([values[c]["t"] - values[c]["f"] for c in cat_ids])
 
     return vector
 
 
 def euclidean_distance(v1: list[float], v2: list[float]) -> float:
     """Calculate Euclidean distance between two vectors."""
-    return math.sqrt(sum((a - b) ** 2 for a, b in zip(v1, v2)))
+    return math.dist(v1, v2)
 
 
-def find_most_different_pairs(breeds: dict, names: dict, top_k: int = 20):
-    """Find breed pairs with maximum distance."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
+def pairwise_distances(vectors: list[tuple[float, ...]]) -> array:
+    """Calculate Euclidean distances for all pairs i < j, flattened row by row."""
+    dist = math.dist
+
+    distances = array("d")
+    for i, v1 in enumerate(vectors):
+        distances.extend([dist(v1, v2) for v2 in vectors[i + 1:]])
+
+    return distances
+
+
+def top_pairs(
+    breed_ids: list[str],
+    distances: array,
+    top_k: int,
+    largest: bool
+) -> list[tuple[str, str, float]]:
+    """Pick the top_k pairs from flat distances and map them back to breed ids."""
+    n = len(breed_ids)
+    select = heapq.nlargest if largest else heapq.nsmallest
+    order = select(top_k, range(len(distances)), key=distances.__getitem__)
 
-    distances = []
-    breed_ids = list(vectors.keys())
+    # Offset of each row's first pair in the flat array
+    row_starts = [i * (2 * n - i - 1) // 2 for i in range(n)]
 
-    for i, bid1 in enumerate(breed_ids):
-        for bid2 in breed_ids[i+1:]:
-            dist = euclidean_distance(vectors[bid1], vectors[bid2])
-            distances.append((bid1, bid2, dist))
+    pairs = []
+    for idx in order:
+        i = bisect_right(row_starts, idx) - 1
+        j = i + 1 + idx - row_starts[i]
+        pairs.append((breed_ids[i], breed_ids[j], distances[idx]))
 
-    distances.sort(key=lambda x: x[2], reverse=True)
+    return pairs
+
+
+def find_most_different_pairs(matrix: "BreedMatrix", names: dict, top_k: int = 20):
+    """Find breed pairs with maximum distance."""
+    distances = pairwise_distances(matrix.rows)
 
     print(f"\n{'='*70}")
     print(f"  TOP {top_k} MOST DIFFERENT BREED PAIRS")
     print(f"{'='*70}\n")
 
-    for bid1, bid2, dist in distances[:top_k]:
+    for bid1, bid2, dist in top_pairs(matrix.ids, distances, top_k, largest=True):
         name1 = names.get(bid1, bid1)
         name2 = names.get(bid2, bid2)
         print(f"  {dist:.2f}  {name1} <-> {name2}")
 
 
-def find_most_similar_pairs(breeds: dict, names: dict, top_k: int = 20):
+def find_most_similar_pairs(matrix: "BreedMatrix", names: dict, top_k: int = 20):
     """Find breed pairs with minimum distance."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
-
-    distances = []
-    breed_ids = list(vectors.keys())
-
-    for i, bid1 in enumerate(breed_ids):
-        for bid2 in breed_ids[i+1:]:
-            dist = euclidean_distance(vectors[bid1], vectors[bid2])
-            distances.append((bid1, bid2, dist))
-
-    distances.sort(key=lambda x: x[2])
+    distances = pairwise_distances(matrix.rows)
 
     print(f"\n{'='*70}")
     print(f"  TOP {top_k} MOST SIMILAR BREED PAIRS")
     print(f"{'='*70}\n")
 
-    for bid1, bid2, dist in distances[:top_k]:
+    for bid1, bid2, dist in top_pairs(matrix.ids, distances, top_k, largest=False):
         name1 = names.get(bid1, bid1)
         name2 = names.get(bid2, bid2)
         print(f"  {dist:.2f}  {name1} <-> {name2}")
 
 
-def simple_kmeans(vectors: dict[str, list[float]], k: int = 5, max_iter: int = 100):
+def segment_means(
+    rows: list[tuple[float, ...]],
+    labels: list[int],
+    k: int
+) -> list[tuple[float, ...] | None]:
+    """Mean row for each label 0..k-1 (None if a label has no rows)."""
+    members = [[] for _ in range(k)]
+    for row, label in zip(rows, labels):
+        members[label].append(row)
+
+    return [
+        tuple([sum(col) / len(m) for col in zip(*m)]) if m else None
+        for m in members
+    ]
+
+
+def simple_kmeans(matrix: "BreedMatrix", k: int = 5, max_iter: int = 100):
     """Simple K-means clustering."""
     import random
 
-    breed_ids = list(vectors.keys())
-    n_features = len(next(iter(vectors.values())))
+    vectors = matrix.rows
+    dist = math.dist
 
-    # Initialize centroids randomly
-    centroid_ids = random.sample(breed_ids, k)
-    centroids = [vectors[bid].copy() for bid in centroid_ids]
+    # k-means++ seeding: pick each next centroid with probability
+    # proportional to squared distance from the nearest one chosen so far
+    n = len(vectors)
+    centroids = [vectors[random.randrange(n)]]
+    d2 = [dist(vec, centroids[0]) ** 2 for vec in vectors]
+    for _ in range(1, k):
+        if sum(d2) > 0:
+            idx = random.choices(range(n), weights=d2)[0]
+        else:
+            idx = random.randrange(n)
+        centroids.append(vectors[idx])
+        d2 = [min(d, dist(vec, vectors[idx]) ** 2) for d, vec in zip(d2, vectors)]
 
-    assignments = {}
+    labels = None
 
     for _ in range(max_iter):
         # Assign breeds to nearest centroid
-        new_assignments = {}
-        for bid, vec in vectors.items():
-            distances = [euclidean_distance(vec, c) for c in centroids]
-            cluster = distances.index(min(distances))
-            new_assignments[bid] = cluster
+        new_labels = []
+        for vec in vectors:
+            distances = [dist(vec, c) for c in centroids]
+            new_labels.append(distances.index(min(distances)))
 
-        if new_assignments == assignments:
+        if new_labels == labels:
             break
-        assignments = new_assignments
+        labels = new_labels
 
-        # Update centroids
-        for c in range(k):
-            members = [vectors[bid] for bid, cluster in assignments.items() if cluster == c]
-            if members:
-                centroids[c] = [
-                    sum(m[i] for m in members) / len(members)
-                    for i in range(n_features)
-                ]
+        # Update centroids; an empty cluster keeps its previous centroid
+        means = segment_means(vectors, labels, k)
+        centroids = [m if m is not None else c for m, c in zip(means, centroids)]
 
+    assignments = dict(zip(matrix.ids, labels))
     return assignments, centroids
 
 
@@ -150,63 +214,120 @@ def load_user_needs() -> dict:
     return {n["id"]: n for n in data["needs"]}
 
 
-def get_feature_names(breeds: dict) -> list[str]:
-    """Get ordered list of feature names matching vector indices."""
-    sample = next(iter(breeds.values()))
-    names = []
+def index_needs_by_feature(user_needs: dict) -> dict[str, list[tuple]]:
+    """Map each feature to (need_pos, need_id, need_name, negated) for needs using it.
+
+    negated is True if any reference to the feature in the formula is ~feature.
+    """
+    feature_index = {}
+
+    for pos, (need_id, need) in enumerate(user_needs.items()):
+        polarity = {}
+        for match in _FEATURE_RE.finditer(need.get("formula", "")):
+            feat = match.group(2)
+            polarity[feat] = polarity.get(feat, False) or bool(match.group(1))
+
+        need_name = need.get("name", need_id)
+        for feat, negated in polarity.items():
+            feature_index.setdefault(feat, []).append((pos, need_id, need_name, negated))
 
-    for feat_id in sorted(sample.get("features", {}).keys()):
-        names.append(feat_id)
+    return feature_index
 
-    for group_id in ["size_group", "height_group", "lifespan_group"]:
-        group = sample.get("categories", {}).get(group_id, {})
-        for cat_id in sorted(group.get("values", {}).keys()):
-            names.append(cat_id)
 
+def get_feature_names(breeds: dict) -> list[str]:
+    """Get ordered list of feature names matching vector indices."""
+    feat_ids, group_cats = feature_order(next(iter(breeds.values())))
+    names = list(feat_ids)
+    for _, cat_ids in group_cats:
+        names.extend(cat_ids)
     return names
 
 
+@dataclass
+class BreedMatrix:
+    """Breed feature vectors: one row per breed, one column per feature.
+
+    The first n_features columns are features; the rest are categories.
+    """
+    ids: list[str]
+    feature_names: list[str]
+    n_features: int
+    rows: list[tuple[float, ...]]
+    columns: list[tuple[float, ...]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.columns = list(zip(*self.rows))
+
+    @classmethod
+    def from_breeds(cls, breeds: dict) -> "BreedMatrix":
+        ids = list(breeds.keys())
+        # All breeds share one layout, so sort keys once from the first breed
+        order = feature_order(breeds[ids[0]])
+        return cls(
+            ids=ids,
+            feature_names=get_feature_names(breeds),
+            n_features=len(order[0]),
+            # Tuples hit math.dist's fast path (no per-call conversion)
+            rows=[tuple(breed_to_vector(breeds[bid], order)) for bid in ids],
+        )
+
+
+def load_breed_matrix() -> BreedMatrix:
+    """Load the breed matrix, reusing the pickle cache if fuzzy files are unchanged."""
+    fuzzy_files = sorted((DOMAIN_DIR / "fuzzy").glob("*.json"))
+    key = [(p.name, p.stat().st_mtime_ns) for p in fuzzy_files]
+
+    try:
+        with open(MATRIX_CACHE, "rb") as f:
+            cached_key, fields = pickle.load(f)
+        if cached_key == key:
+            return BreedMatrix(*fields)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    matrix = BreedMatrix.from_breeds(load_breeds())
+
+    # Store plain fields so the cache loads both as script and as module
+    fields = (matrix.ids, matrix.feature_names, matrix.n_features, matrix.rows)
+    MATRIX_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MATRIX_CACHE.with_name(f"{MATRIX_CACHE.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump((key, fields), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, MATRIX_CACHE)
+
+    return matrix
+
+
 def analyze_cluster_characteristics(
-    breeds: dict,
-    names: dict,
+    matrix: BreedMatrix,
     assignments: dict,
     top_features: int = 5
 ) -> dict:
     """Analyze distinctive characteristics for each cluster."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
-    feature_names = get_feature_names(breeds)
-    n_features = len(feature_names)
-
     # Calculate global mean for each feature
-    all_vectors = list(vectors.values())
-    global_mean = [
-        sum(v[i] for v in all_vectors) / len(all_vectors)
-        for i in range(n_features)
-    ]
+    n_breeds = len(matrix.rows)
+    global_mean = [sum(col) / n_breeds for col in matrix.columns]
 
-    # Group by cluster
+    # Group by cluster (assignments follow matrix row order)
     clusters = {}
     for bid, cluster in assignments.items():
         if cluster not in clusters:
             clusters[cluster] = []
         clusters[cluster].append(bid)
 
+    labels = list(assignments.values())
+    cluster_means = segment_means(matrix.rows, labels, max(labels) + 1)
+
     cluster_profiles = {}
 
     for cluster_id, member_ids in clusters.items():
-        member_vectors = [vectors[bid] for bid in member_ids]
-
-        # Calculate cluster mean
-        cluster_mean = [
-            sum(v[i] for v in member_vectors) / len(member_vectors)
-            for i in range(n_features)
-        ]
+        cluster_mean = cluster_means[cluster_id]
 
         # Calculate deviation from global mean
-        deviations = []
-        for i, feat_name in enumerate(feature_names):
-            deviation = cluster_mean[i] - global_mean[i]
-            deviations.append((feat_name, deviation, cluster_mean[i]))
+        deviations = [
+            (feat_name, mean - overall, mean)
+            for feat_name, mean, overall in zip(matrix.feature_names, cluster_mean, global_mean)
+        ]
 
         # Sort by absolute deviation
         deviations.sort(key=lambda x: abs(x[1]), reverse=True)
@@ -220,33 +341,34 @@ def analyze_cluster_characteristics(
     return cluster_profiles
 
 
-def map_features_to_needs(features: list[tuple], user_needs: dict) -> list[str]:
-    """Find user needs that match given features."""
-    matched_needs = []
+def map_features_to_needs(features: list[tuple], feature_index: dict) -> list[tuple]:
+    """Find user needs that match given features, in user_needs order."""
+    matched = {}
 
-    for need_id, need in user_needs.items():
-        formula = need.get("formula", "")
-        for feat_name, deviation, _ in features:
-            # Check if feature appears in formula (simple string match)
-            if feat_name in formula:
-                # Determine if need is satisfied by high or low value
-                is_negated = f"~{feat_name}" in formula
-                if (deviation > 0 and not is_negated) or (deviation < 0 and is_negated):
-                    matched_needs.append((need_id, need.get("name", need_id)))
-                    break
+    for feat_name, deviation, _ in features:
+        for pos, need_id, need_name, negated in feature_index.get(feat_name, ()):
+            # Need is satisfied by high value, or by low value if negated
+            if (deviation > 0 and not negated) or (deviation < 0 and negated):
+                matched.setdefault(pos, (need_id, need_name))
 
-    return matched_needs
+    return [matched[pos] for pos in sorted(matched)]
 
 
-def cluster_breeds(breeds: dict, names: dict, k: int = 5):
-    """Cluster breeds and display results with characteristics."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
+def cluster_breeds(
+    matrix: BreedMatrix,
+    names: dict,
+    k: int = 5,
+    clustering: tuple[dict, list] | None = None
+):
+    """Cluster breeds and display results with characteristics.
 
-    assignments, centroids = simple_kmeans(vectors, k=k)
+    Pass clustering (simple_kmeans output for this k) to reuse an existing run.
+    """
+    assignments, centroids = clustering or simple_kmeans(matrix, k=k)
 
     # Analyze cluster characteristics
-    profiles = analyze_cluster_characteristics(breeds, names, assignments)
-    user_needs = load_user_needs()
+    profiles = analyze_cluster_characteristics(matrix, assignments)
+    feature_index = index_needs_by_feature(load_user_needs())
 
     print(f"\n{'='*70}")
     print(f"  K-MEANS CLUSTERING (k={k})")
@@ -286,7 +408,7 @@ def cluster_breeds(breeds: dict, names: dict, k: int = 5):
 
         # Map to user needs
         all_features = profile["top_positive"] + profile["top_negative"]
-        matched = map_features_to_needs(all_features, user_needs)
+        matched = map_features_to_needs(all_features, feature_index)
 
         if matched:
             print(f"\n  Best for users who need:")
@@ -296,26 +418,16 @@ def cluster_breeds(breeds: dict, names: dict, k: int = 5):
     print()
 
 
-def analyze_needs_coverage(breeds: dict, k: int = 6):
+def analyze_needs_coverage(
+    matrix: BreedMatrix,
+    k: int = 6,
+    clustering: tuple[dict, list] | None = None
+):
     """Check if dominant cluster features are covered by user needs."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
-    assignments, _ = simple_kmeans(vectors, k=k)
-    names = load_breed_names()
+    assignments, _ = clustering or simple_kmeans(matrix, k=k)
 
-    profiles = analyze_cluster_characteristics(breeds, names, assignments, top_features=10)
-    user_needs = load_user_needs()
-
-    # Build feature -> needs mapping
-    feature_to_needs = {}
-    for need_id, need in user_needs.items():
-        formula = need.get("formula", "")
-        # Extract feature names from formula (simple parsing)
-        import re
-        features_in_formula = re.findall(r'[a-z_]+', formula)
-        for feat in features_in_formula:
-            if feat not in feature_to_needs:
-                feature_to_needs[feat] = []
-            feature_to_needs[feat].append((need_id, need.get("name", need_id)))
+    profiles = analyze_cluster_characteristics(matrix, assignments, top_features=10)
+    feature_index = index_needs_by_feature(load_user_needs())
 
     print(f"\n{'='*70}")
     print(f"  NEEDS COVERAGE ANALYSIS")
@@ -335,7 +447,7 @@ def analyze_needs_coverage(breeds: dict, k: int = 6):
         uncovered = []
 
         for feat, dev, mean in all_features:
-            needs = feature_to_needs.get(feat, [])
+            needs = [(need_id, name) for _, need_id, name, _ in feature_index.get(feat, ())]
             if needs:
                 covered.append((feat, dev, needs))
                 all_covered.add(feat)
@@ -391,42 +503,38 @@ def analyze_needs_coverage(breeds: dict, k: int = 6):
                 print(f"      formula: {formula}")
 
 
-def analyze_cluster_differentiation(breeds: dict, k: int = 6):
+def analyze_cluster_differentiation(
+    matrix: BreedMatrix,
+    names: dict,
+    k: int = 6,
+    clustering: tuple[dict, list] | None = None
+):
     """Find overlapping needs between clusters and suggest differentiating questions."""
-    vectors = {bid: breed_to_vector(data) for bid, data in breeds.items()}
-    assignments, _ = simple_kmeans(vectors, k=k)
-    names = load_breed_names()
-    feature_names = get_feature_names(breeds)
+    assignments, cluster_centroids = clustering or simple_kmeans(matrix, k=k)
+    feature_names = matrix.feature_names
 
-    profiles = analyze_cluster_characteristics(breeds, names, assignments, top_features=10)
+    profiles = analyze_cluster_characteristics(matrix, assignments, top_features=10)
     user_needs = load_user_needs()
+    feature_index = index_needs_by_feature(user_needs)
 
     # Get needs for each cluster
     cluster_needs = {}
     for cluster_id, profile in profiles.items():
         all_features = profile["top_positive"] + profile["top_negative"]
-        matched = map_features_to_needs(all_features, user_needs)
+        matched = map_features_to_needs(all_features, feature_index)
         cluster_needs[cluster_id] = set(n[0] for n in matched)
 
     print(f"\n{'='*70}")
     print(f"  CLUSTER DIFFERENTIATION ANALYSIS")
     print(f"{'='*70}")
 
-    # Calculate cluster centroids for comparison
+    # K-means centroids are the member means of the final assignments
     clusters = {}
     for bid, cluster in assignments.items():
         if cluster not in clusters:
             clusters[cluster] = []
         clusters[cluster].append(bid)
 
-    cluster_centroids = {}
-    for cluster_id, member_ids in clusters.items():
-        member_vectors = [vectors[bid] for bid in member_ids]
-        cluster_centroids[cluster_id] = [
-            sum(v[i] for v in member_vectors) / len(member_vectors)
-            for i in range(len(feature_names))
-        ]
-
     # Find overlapping clusters
     cluster_ids = sorted(profiles.keys())
     overlaps = []
@@ -456,30 +564,29 @@ def analyze_cluster_differentiation(breeds: dict, k: int = 6):
         print(f"  Cluster {c2+1}: {', '.join(names.get(b, b) for b in sorted(clusters[c2])[:5])}...")
 
         print(f"\n  Common needs ({len(common_needs)}):")
-        for need_id in list(common_needs)[:5]:
+        for need_id in [nid for nid in user_needs if nid in common_needs][:5]:
             need_name = user_needs.get(need_id, {}).get("name", need_id)
             print(f"    • {need_name}")
 
         # Find features that differentiate these clusters
         print(f"\n  DIFFERENTIATING FEATURES (to split these clusters):")
-        diffs = []
-        for i, feat in enumerate(feature_names):
-            diff = cluster_centroids[c1][i] - cluster_centroids[c2][i]
-            if abs(diff) > 0.2:  # Significant difference
-                diffs.append((feat, diff, cluster_centroids[c1][i], cluster_centroids[c2][i]))
-
-        diffs.sort(key=lambda x: abs(x[1]), reverse=True)
+        diffs = [
+            (feat, val1 - val2, val1, val2)
+            for feat, val1, val2 in zip(feature_names, cluster_centroids[c1], cluster_centroids[c2])
+            if abs(val1 - val2) > 0.2  # Significant difference
+        ]
+        top_diffs = heapq.nlargest(5, diffs, key=lambda x: abs(x[1]))
 
-        for feat, diff, val1, val2 in diffs[:5]:
+        for feat, diff, val1, val2 in top_diffs:
             # Check if this feature has a need
-            has_need = any(feat in need.get("formula", "") for need in user_needs.values())
+            has_need = feat in feature_index
             status = "✓" if has_need else "✗ NEED NEW QUESTION"
             arrow = ">" if diff > 0 else "<"
             print(f"    {feat:<25} C{c1+1}={val1:+.2f} {arrow} C{c2+1}={val2:+.2f}  {status}")
 
         # Suggest new needs
-        uncovered_diffs = [(f, d, v1, v2) for f, d, v1, v2 in diffs[:5]
-                          if not any(f in need.get("formula", "") for need in user_needs.values())]
+        uncovered_diffs = [(f, d, v1, v2) for f, d, v1, v2 in top_diffs
+                          if f not in feature_index]
 
         if uncovered_diffs:
             print(f"\n  SUGGESTED NEW NEEDS to differentiate:")
@@ -490,20 +597,13 @@ def analyze_cluster_differentiation(breeds: dict, k: int = 6):
                     print(f"    → Question revealing HIGH {feat} (matches cluster {c2+1})")
 
 
-def analyze_feature_variance(breeds: dict):
+def analyze_feature_variance(matrix: BreedMatrix):
     """Find features with highest variance (best discriminators)."""
-    # Collect all feature values
-    feature_values = {}
-
-    for breed_data in breeds.values():
-        for feat_id, feat_data in breed_data.get("features", {}).items():
-            if feat_id not in feature_values:
-                feature_values[feat_id] = []
-            feature_values[feat_id].append(feat_data["t"] - feat_data["f"])
+    n = matrix.n_features
 
-    # Calculate variance for each feature
+    # Calculate variance for each feature column
     variances = []
-    for feat_id, values in feature_values.items():
+    for feat_id, values in zip(matrix.feature_names[:n], matrix.columns[:n]):
         mean = sum(values) / len(values)
         variance = sum((v - mean) ** 2 for v in values) / len(values)
         variances.append((feat_id, variance, min(values), max(values)))
@@ -523,6 +623,7 @@ def analyze_feature_variance(breeds: dict):
 
 def main():
     import argparse
+    import random
 
     parser = argparse.ArgumentParser(description="Cluster dog breeds")
     parser.add_argument("--similar", "-s", action="store_true", help="Show most similar pairs")
@@ -532,13 +633,18 @@ def main():
     parser.add_argument("--coverage", action="store_true", help="Check needs coverage for cluster features")
     parser.add_argument("--diff", action="store_true", help="Find overlapping clusters and suggest differentiating needs")
     parser.add_argument("--top", "-k", type=int, default=20, help="Number of pairs to show")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible K-means")
 
     args = parser.parse_args()
 
-    breeds = load_breeds()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Feature vectors are built once and shared across all analyses
+    matrix = load_breed_matrix()
     names = load_breed_names()
 
-    print(f"\nLoaded {len(breeds)} breeds")
+    print(f"\nLoaded {len(matrix.ids)} breeds")
 
     if not any([args.similar, args.different, args.cluster, args.variance, args.coverage, args.diff]):
         # Default: show all
@@ -547,23 +653,33 @@ def main():
         args.similar = True
         args.cluster = 5
 
+    # Run K-means once per k and share it between analyses
+    clusterings = {}
+
+    def clustering(k: int) -> tuple[dict, list]:
+        if k not in clusterings:
+            clusterings[k] = simple_kmeans(matrix, k=k)
+        return clusterings[k]
+
+    analysis_k = args.cluster if args.cluster > 0 else 6
+
     if args.coverage:
-        analyze_needs_coverage(breeds, k=args.cluster if args.cluster > 0 else 6)
+        analyze_needs_coverage(matrix, k=analysis_k, clustering=clustering(analysis_k))
 
     if args.diff:
-        analyze_cluster_differentiation(breeds, k=args.cluster if args.cluster > 0 else 6)
+        analyze_cluster_differentiation(matrix, names, k=analysis_k, clustering=clustering(analysis_k))
 
     if args.variance:
-        analyze_feature_variance(breeds)
+        analyze_feature_variance(matrix)
 
     if args.different:
-        find_most_different_pairs(breeds, names, top_k=args.top)
+        find_most_different_pairs(matrix, names, top_k=args.top)
 
     if args.similar:
-        find_most_similar_pairs(breeds, names, top_k=args.top)
+        find_most_similar_pairs(matrix, names, top_k=args.top)
 
     if args.cluster > 0:
-        cluster_breeds(breeds, names, k=args.cluster)
+        cluster_breeds(matrix, names, k=args.cluster, clustering=clustering(args.cluster))
 
 
 if __name__ == "__main__":
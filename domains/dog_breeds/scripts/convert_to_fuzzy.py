@@ -29,11 +29,15 @@ States:
     - CONFLICT: high t, high f
 """
 
+import functools
 import json
+import math
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-from fuzzy4 import FuzzyBool
 
 # Setup paths
 SCRIPT_DIR = Path(__file__).parent
@@ -41,10 +45,10 @@ DOMAIN_DIR = SCRIPT_DIR.parent
 CONFIG_FILE = DOMAIN_DIR / "config.json"
 
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> dict:
-    """Load domain config."""
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load domain config (parsed once per process)."""
+    return json.loads(CONFIG_FILE.read_bytes())
 
 
 CONFIG = load_config()
@@ -52,24 +56,43 @@ CONTENT_DIR = DOMAIN_DIR / CONFIG["paths"]["content"]
 EXTRACTED_DIR = DOMAIN_DIR / CONFIG["paths"]["extracted"]
 FUZZY_DIR = DOMAIN_DIR / CONFIG["paths"]["fuzzy"]
 
+# Numerical parameter -> category group in object_features.json
+PARAM_TO_GROUP = (
+    ("weight_kg", "size_group"),
+    ("height_cm", "height_group"),
+    ("lifespan_years", "lifespan_group"),
+)
 
+
+@functools.lru_cache(maxsize=1)
 def load_feature_spec() -> dict:
-    """Load object_features.json with category definitions."""
+    """Load object_features.json with category definitions (parsed once per process)."""
     spec_path = CONTENT_DIR / "object_features.json"
-    with open(spec_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json.loads(spec_path.read_bytes())
+
+
+# Order matters: on ties the first state wins, as in FuzzyBool.dominant_state()
+STATES = ("true", "false", "unknown", "conflict")
+
 
+def _clamp(value: float) -> float:
+    """Clamp value to [0, 1] range (as FuzzyBool does on construction)."""
+    return max(0.0, min(1.0, value))
 
-def convert_single_entry(value: float, confidence: float) -> FuzzyBool:
+
+def fuzzy_components(t: float, f: float) -> tuple[float, float, float, float]:
     """
-    Convert single value + confidence to fuzzy (t, f) vector.
+    Return (truth, falsity, unknown, conflict) for clamped (t, f).
+
+    Same product t-norm arithmetic as the FuzzyBool properties, without
+    allocating a FuzzyBool per feature.
     """
-    if value is None:
-        return FuzzyBool(0, 0)  # UNKNOWN
+    return t * (1.0 - f), f * (1.0 - t), (1.0 - t) * (1.0 - f), t * f
 
-    t = value * confidence
-    f = (1 - value) * confidence
-    return FuzzyBool(t, f)
+
+def dominant_state(components: tuple[float, float, float, float]) -> str:
+    """Return the dominant logical state for fuzzy_components() output."""
+    return STATES[components.index(max(components))]
 
 
 def aggregate_feature_entries(entries: list[dict]) -> dict:
@@ -94,10 +117,16 @@ def aggregate_feature_entries(entries: list[dict]) -> dict:
             "sources": []
         }
 
-    # Filter out null values
-    valid_entries = [e for e in entries if e.get("value") is not None]
+    # One pass: drop null values, fill in default confidence, collect sources
+    pairs = []
+    sources = []
+    for e in entries:
+        value = e.get("value")
+        if value is not None:
+            pairs.append((value, e.get("confidence", 0.5)))
+            sources.append(e.get("source", "unknown"))
 
-    if not valid_entries:
+    if not pairs:
         return {
             "t": 0, "f": 0,
             "state": "U",
@@ -105,159 +134,216 @@ def aggregate_feature_entries(entries: list[dict]) -> dict:
             "note": "all values null"
         }
 
-    # Convert each entry to FuzzyBool and accumulate
-    accumulated = FuzzyBool(0, 0)  # Start with UNKNOWN
-
-    for entry in valid_entries:
-        value = entry["value"]
-        confidence = entry.get("confidence", 0.5)
+    # Accumulate evidence, starting from UNKNOWN (0, 0)
+    t = f = 0.0
 
+    # Conversion and clamping are inlined: this loop runs for every
+    # entry of every feature of every breed
+    for value, confidence in pairs:
         # Convert to fuzzy: t = value * conf, f = (1-value) * conf
-        fb = convert_single_entry(value, confidence)
+        et = value * confidence
+        ef = (1 - value) * confidence
+        et = 0.0 if et < 0.0 else 1.0 if et > 1.0 else et
+        ef = 0.0 if ef < 0.0 else 1.0 if ef > 1.0 else ef
 
-        # Accumulate evidence using fuzzy4 + operator
-        accumulated = accumulated + fb
+        # fuzzy4 accumulation (+): probabilistic s-norm a + b - a*b.
+        # Not saturating addition, so sums cannot be collected first.
+        t = t + et - t * et
+        f = f + ef - f * ef
+        t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+        f = 0.0 if f < 0.0 else 1.0 if f > 1.0 else f
+
+    truth, falsity, unknown, conflict = components = fuzzy_components(t, f)
 
     return {
-        "t": round(accumulated.t, 3),
-        "f": round(accumulated.f, 3),
-        "state": accumulated.dominant_state(),
-        "sources": [e.get("source", "unknown") for e in valid_entries],
-        "n_sources": len(valid_entries),
+        "t": round(t, 3),
+        "f": round(f, 3),
+        "state": dominant_state(components),
+        "sources": sources,
+        "n_sources": len(pairs),
         "components": {
-            "truth": round(accumulated.truth, 3),
-            "falsity": round(accumulated.falsity, 3),
-            "unknown": round(accumulated.unknown, 3),
-            "conflict": round(accumulated.conflict, 3),
+            "truth": round(truth, 3),
+            "falsity": round(falsity, 3),
+            "unknown": round(unknown, 3),
+            "conflict": round(conflict, 3),
         }
     }
 
 
-def value_in_range(value: float | None, min_val: float | None, max_val: float | None) -> bool | None:
-    """Check if value falls within [min_val, max_val] range.
+@dataclass(frozen=True, slots=True)
+class PreparedGroup:
+    """Category group from the spec with bounds and derived formulas pre-parsed."""
+    # (cat_id, lo, hi, overlap_lo, overlap_hi) per base category
+    categories: tuple[tuple[str, float, float, float, float], ...]
+    # (derived_id, [part ids]) per derived category
+    derived: tuple[tuple[str, list[str]], ...]
+
+
+def prepare_group(category_group: dict) -> PreparedGroup:
+    """Convert a spec category group into PreparedGroup form."""
+    categories = []
+    for category in category_group["values"]:
+        cat_min = category.get("min")
+        cat_max = category.get("max")
+        categories.append((
+            category["id"],
+            # Missing bounds become infinities so every check is a float comparison
+            -math.inf if cat_min is None else cat_min,
+            math.inf if cat_max is None else cat_max,
+            # Range overlap treats any falsy bound (including 0) as open
+            cat_min if cat_min else -math.inf,
+            cat_max if cat_max else math.inf,
+        ))
+
+    # Parse formula: "cat1 | cat2 | cat3"
+    derived = tuple(
+        (d["id"], [p.strip() for p in d["formula"].split("|")])
+        for d in category_group.get("derived", [])
+    )
+
+    return PreparedGroup(categories=tuple(categories), derived=derived)
+
+
+def prepare_spec(spec: dict) -> dict[str, PreparedGroup]:
+    """Prepare every parameter category group present in the spec, once per run."""
+    return {
+        group_name: prepare_group(spec[group_name])
+        for _, group_name in PARAM_TO_GROUP
+        if group_name in spec
+    }
+
+
+def category_votes(
+    prepared: list[tuple],
+    lo: float,
+    hi: float,
+    overlap_lo: float,
+    overlap_hi: float
+) -> tuple[list[float], list[float]]:
+    """
+    Split measurement confidences into votes for / against one category.
 
-    Returns None if value is None (unknown).
+    A measurement votes FOR if its value (or range midpoint) falls within
+    [lo, hi), or if its [min, max] range overlaps [overlap_lo, overlap_hi).
     """
-    if value is None:
-        return None  # Unknown
-    if min_val is not None and value < min_val:
-        return False
-    if max_val is not None and value >= max_val:
-        return False
-    return True
+    votes_for = []
+    votes_against = []
+
+    for confidence, is_range, val_min, val_max, point in prepared:
+        in_range = lo <= point < hi
+        if is_range and not in_range:
+            in_range = val_max >= overlap_lo and val_min < overlap_hi
+
+        if in_range:
+            votes_for.append(confidence)
+        else:
+            votes_against.append(confidence)
+
+    return votes_for, votes_against
 
 
 def convert_parameter_to_categories(
     measurements: list[dict],
-    category_group: dict
+    category_group: dict | PreparedGroup
 ) -> dict[str, dict]:
     """
     Convert numerical measurements to fuzzy one-hot categories.
 
     Args:
         measurements: List of {"value": [min, max] or X, "confidence": Y, "source": "..."}
-        category_group: Category definition with "values" list
+        category_group: Category definition with "values" list, or its PreparedGroup
 
     Returns:
         Dict mapping category_id to fuzzy result
     """
+    if not isinstance(category_group, PreparedGroup):
+        category_group = prepare_group(category_group)
+
     results = {}
 
-    # Compute base categories
-    for category in category_group["values"]:
-        cat_id = category["id"]
-        cat_min = category.get("min")
-        cat_max = category.get("max")
+    # Normalize measurements once: (confidence, is_range, val_min, val_max, point)
+    prepared = []
+    for m in measurements:
+        value = m.get("value")
+        confidence = m.get("confidence", 0.5)
 
-        votes_for = []
-        votes_against = []
+        if value is None:
+            continue
 
-        for m in measurements:
-            value = m.get("value")
-            confidence = m.get("confidence", 0.5)
+        # Handle range values [min, max]
+        if isinstance(value, list) and len(value) == 2:
+            val_min, val_max = value
 
-            if value is None:
+            # Skip if both range bounds are None
+            if val_min is None and val_max is None:
                 continue
 
-            # Handle range values [min, max]
-            if isinstance(value, list) and len(value) == 2:
-                val_min, val_max = value
-
-                # Skip if both range bounds are None
-                if val_min is None and val_max is None:
-                    continue
-
-                # Use available value if one is None
-                if val_min is None:
-                    val_min = val_max
-                if val_max is None:
-                    val_max = val_min
-
-                # Check if ranges overlap
-                range_overlaps = not (val_max < cat_min if cat_min else False) and \
-                                 not (val_min >= cat_max if cat_max else False)
-                # Use midpoint for single-value comparison
-                midpoint = (val_min + val_max) / 2
-
-                if range_overlaps or value_in_range(midpoint, cat_min, cat_max):
-                    votes_for.append(confidence)
-                else:
-                    votes_against.append(confidence)
-            else:
-                # Single value
-                in_range = value_in_range(value, cat_min, cat_max)
-                if in_range is None:
-                    continue  # Unknown value, skip
-                elif in_range:
-                    votes_for.append(confidence)
-                else:
-                    votes_against.append(confidence)
+            # Use available value if one is None
+            if val_min is None:
+                val_min = val_max
+            if val_max is None:
+                val_max = val_min
+
+            # Use midpoint for single-value comparison
+            prepared.append((confidence, True, val_min, val_max, (val_min + val_max) / 2))
+        else:
+            prepared.append((confidence, False, None, None, value))
+
+    # Compute base categories
+    for cat_id, *bounds in category_group.categories:
+        votes_for, votes_against = category_votes(prepared, *bounds)
 
         # Calculate t and f as average of votes
         n = len(votes_for) + len(votes_against)
         t = sum(votes_for) / n if n > 0 else 0
         f = sum(votes_against) / n if n > 0 else 0
 
-        fb = FuzzyBool(t, f)
-
         results[cat_id] = {
             "t": round(t, 3),
             "f": round(f, 3),
-            "state": fb.dominant_state(),
+            "state": dominant_state(fuzzy_components(_clamp(t), _clamp(f))),
             "votes_for": len(votes_for),
             "votes_against": len(votes_against),
         }
 
     # Compute derived categories (OR of base categories)
-    for derived in category_group.get("derived", []):
-        derived_id = derived["id"]
-        formula = derived["formula"]
-
-        # Parse formula: "cat1 | cat2 | cat3"
-        parts = [p.strip() for p in formula.split("|")]
-
-        # OR = max of t values, min of f values (optimistic)
-        t_values = [results[p]["t"] for p in parts if p in results]
-        f_values = [results[p]["f"] for p in parts if p in results]
-
-        if t_values:
-            # Use FuzzyBool OR operation
-            combined = FuzzyBool(t_values[0], f_values[0])
-            for i in range(1, len(t_values)):
-                combined = combined | FuzzyBool(t_values[i], f_values[i])
+    for derived_id, parts in category_group.derived:
+        # fuzzy4 OR (|): t = s-norm (a + b - a*b), f = product t-norm (a * b)
+        t = f = None
+        for p in parts:
+            if p not in results:
+                continue
+            pt = _clamp(results[p]["t"])
+            pf = _clamp(results[p]["f"])
+            if t is None:
+                t, f = pt, pf
+            else:
+                t = _clamp(t + pt - t * pt)
+                f = _clamp(f * pf)
 
+        if t is not None:
             results[derived_id] = {
-                "t": round(combined.t, 3),
-                "f": round(combined.f, 3),
-                "state": combined.dominant_state(),
-                "derived_from": parts,
+                "t": round(t, 3),
+                "f": round(f, 3),
+                "state": dominant_state(fuzzy_components(t, f)),
+                "derived_from": list(parts),
             }
 
     return results
 
 
-def convert_breed(extracted_data: dict, spec: dict) -> dict:
-    """Convert all features for a breed to fuzzy format."""
+def convert_breed(
+    extracted_data: dict,
+    spec: dict,
+    groups: dict[str, PreparedGroup] | None = None
+) -> dict:
+    """Convert all features for a breed to fuzzy format.
+
+    Pass groups from prepare_spec(spec) to reuse them across breeds.
+    """
+    if groups is None:
+        groups = prepare_spec(spec)
+
     result = {
         "breed_id": extracted_data["breed_id"],
         "features": {},
@@ -284,20 +370,13 @@ def convert_breed(extracted_data: dict, spec: dict) -> dict:
     # Convert numerical parameters to categories
     params = extracted_data.get("parameters", {})
 
-    # Map parameter -> category group
-    param_to_group = {
-        "weight_kg": "size_group",
-        "height_cm": "height_group",
-        "lifespan_years": "lifespan_group",
-    }
-
-    for param_name, group_name in param_to_group.items():
-        if param_name in params and group_name in spec:
+    for param_name, group_name in PARAM_TO_GROUP:
+        if param_name in params and group_name in groups:
             measurements = params[param_name]
             if isinstance(measurements, list):
                 category_result = convert_parameter_to_categories(
                     measurements,
-                    spec[group_name]
+                    groups[group_name]
                 )
                 result["categories"][group_name] = {
                     "source_param": param_name,
@@ -307,16 +386,27 @@ def convert_breed(extracted_data: dict, spec: dict) -> dict:
     return result
 
 
-def process_file(input_path: Path, output_path: Path, spec: dict) -> bool:
-    """Process a single extracted file."""
+def process_file(
+    input_path: Path,
+    output_path: Path,
+    spec: dict,
+    groups: dict[str, PreparedGroup] | None = None,
+    compact: bool = False
+) -> bool:
+    """Process a single extracted file (compact=True writes minified JSON)."""
     try:
-        with open(input_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(input_path.read_bytes())
 
-        fuzzy_data = convert_breed(data, spec)
+        fuzzy_data = convert_breed(data, spec, groups)
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(fuzzy_data, f, ensure_ascii=False, indent=2)
+        # Serialize in one call, then write atomically (temp file + rename)
+        if compact:
+            text = json.dumps(fuzzy_data, ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = json.dumps(fuzzy_data, ensure_ascii=False, indent=2)
+        tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, output_path)
 
         return True
     except Exception as e:
@@ -324,12 +414,52 @@ def process_file(input_path: Path, output_path: Path, spec: dict) -> bool:
         return False
 
 
+def is_up_to_date(input_path: Path, output_path: Path, deps_mtime: float = 0.0) -> bool:
+    """True if output_path is newer than input_path and every shared dependency."""
+    try:
+        output_mtime = output_path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return output_mtime >= max(input_path.stat().st_mtime, deps_mtime)
+
+
+# Feature spec of the current worker process (set by _init_worker)
+_worker_spec: dict | None = None
+_worker_groups: dict[str, PreparedGroup] | None = None
+_worker_compact = False
+
+
+def _init_worker(compact: bool = False) -> None:
+    """Load and prepare the feature spec once per worker process instead of per task."""
+    global _worker_spec, _worker_groups, _worker_compact
+    _worker_spec = load_feature_spec()
+    _worker_groups = prepare_spec(_worker_spec)
+    _worker_compact = compact
+
+
+def _convert_worker(path: Path) -> tuple[str, bool]:
+    """Convert one extracted file inside a worker process."""
+    return path.name, process_file(
+        path, FUZZY_DIR / path.name, _worker_spec, _worker_groups, _worker_compact
+    )
+
+
 def main():
     """Convert all extracted files to fuzzy format."""
-    FUZZY_DIR.mkdir(parents=True, exist_ok=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert extracted features to fuzzy format")
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Write minified JSON (smaller, faster to write; default is indented for readable diffs)"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Convert every file, even if its fuzzy output is newer than the input"
+    )
+    args = parser.parse_args()
 
-    # Load feature specification
-    spec = load_feature_spec()
+    FUZZY_DIR.mkdir(parents=True, exist_ok=True)
 
     extracted_files = list(EXTRACTED_DIR.glob("*.json"))
 
@@ -337,16 +467,38 @@ def main():
         print("No extracted files found.")
         return
 
+    # Make-style skip: outputs also depend on the feature spec and this converter
+    if not args.force:
+        deps_mtime = max(
+            (CONTENT_DIR / "object_features.json").stat().st_mtime,
+            Path(__file__).stat().st_mtime,
+        )
+        total = len(extracted_files)
+        extracted_files = [
+            p for p in extracted_files
+            if not is_up_to_date(p, FUZZY_DIR / p.name, deps_mtime)
+        ]
+        skipped = total - len(extracted_files)
+        if skipped:
+            print(f"Skipping {skipped} up-to-date files (use --force to convert all)")
+        if not extracted_files:
+            print("Nothing to convert.")
+            return
+
     print(f"Converting {len(extracted_files)} files...")
 
+    # Parse the spec before forking so workers inherit it from the cache
+    load_feature_spec()
+
+    # Files are independent: convert them across all CPU cores
     success = 0
-    for path in extracted_files:
-        output_path = FUZZY_DIR / path.name
-        if process_file(path, output_path, spec):
-            print(f"[OK] {path.name}")
-            success += 1
-        else:
-            print(f"[ERROR] {path.name}")
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(args.compact,)) as pool:
+        for name, ok in pool.map(_convert_worker, extracted_files, chunksize=4):
+            if ok:
+                print(f"[OK] {name}")
+                success += 1
+            else:
+                print(f"[ERROR] {name}")
 
     print(f"\nDone: {success}/{len(extracted_files)} converted")
 
@@ -7,18 +7,19 @@ Usage:
     python extract_features.py --breed akita     # Process single breed
     python extract_features.py --limit 10        # Process first 10 breeds
     python extract_features.py --dry-run         # Show what would be processed
+    python extract_features.py --batch-size 5    # Extract 5 breeds per API request
 """
 
+import asyncio
 import json
 import os
-import re
 import sys
 import argparse
 import logging
 from pathlib import Path
 from typing import Any
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from jinja2 import Environment, FileSystemLoader
 
@@ -30,8 +31,7 @@ CONFIG_FILE = DOMAIN_DIR / "config.json"
 
 def load_config() -> dict:
     """Load domain config."""
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json.loads(CONFIG_FILE.read_bytes())
 
 
 CONFIG = load_config()
@@ -49,13 +49,44 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+def _matching_brace(text: str, start: int) -> int:
+    """Return index of the brace closing text[start], or -1 if unbalanced.
+
+    Braces inside JSON strings (including escaped quotes) are ignored.
+    """
+    depth = 0
+    in_string = False
+    escape = False
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+
+    return -1
+
+
 class FeatureExtractor:
     """Extract breed features using OpenAI API."""
 
     def __init__(
         self,
         model: str | None = None,
-        use_web_search: bool | None = None
+        use_web_search: bool | None = None,
+        batch_size: int | None = None
     ):
         load_dotenv()
 
@@ -69,61 +100,91 @@ class FeatureExtractor:
         self.temperature = llm_config["temperature"]["extraction"]
         self.use_web_search = use_web_search if use_web_search is not None else extraction_config["use_web_search"]
         self.web_search_tool = extraction_config["web_search_tool"]
+        self.max_concurrency = llm_config.get("max_concurrency", 8)
+        self.batch_size = max(1, batch_size or extraction_config.get("batch_size", 1))
 
-        self.client = OpenAI(
+        # One client for the whole run: its httpx pool keeps connections alive
+        # across breeds, so only the first calls pay the TCP/TLS handshake
+        self.client = AsyncOpenAI(
             timeout=llm_config["timeout"],
             max_retries=llm_config["max_retries"]
         )
 
-        # Setup Jinja2
+        # Setup Jinja2 (template compiled once; no per-render mtime checks)
         self.jinja_env = Environment(
             loader=FileSystemLoader(str(PROMPTS_DIR)),
             trim_blocks=True,
-            lstrip_blocks=True
+            lstrip_blocks=True,
+            auto_reload=False
         )
+        self.prompt_template = self.jinja_env.get_template("extract_features.prompt.md")
+        self.batch_template = self.jinja_env.get_template("extract_features_batch.prompt.md")
 
         # Ensure output directory exists
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+    async def close(self) -> None:
+        """Close the API client's connection pool."""
+        await self.client.close()
+
     def load_breeds(self) -> list[dict]:
         """Load breed list from content/breeds.json."""
         breeds_file = CONTENT_DIR / "breeds.json"
-        with open(breeds_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data["breeds"]
+        return json.loads(breeds_file.read_bytes())["breeds"]
 
     def load_breed_source(self, breed_id: str) -> dict | None:
         """Load source data for a breed."""
         source_file = SOURCE_DIR / f"breed_{breed_id}.json"
         if source_file.exists():
-            with open(source_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return json.loads(source_file.read_bytes())
         return None
 
     def render_prompt(self, breed: dict, breed_data: dict | None) -> str:
         """Render the extraction prompt."""
-        template = self.jinja_env.get_template("extract_features.prompt.md")
-        return template.render(
+        return self.prompt_template.render(
             breed_id=breed["id"],
             breed_name=breed["name_en"],
             breed_data=breed_data or {}
         )
 
+    def render_batch_prompt(self, items: list[tuple[dict, dict | None]]) -> str:
+        """Render the extraction prompt for several breeds at once."""
+        return self.batch_template.render(
+            breeds=[
+                {
+                    "breed_id": breed["id"],
+                    "breed_name": breed["name_en"],
+                    "breed_data": breed_data or {},
+                }
+                for breed, breed_data in items
+            ]
+        )
+
     def extract_json(self, text: str) -> str:
         """Extract JSON from model response."""
         # Try to find JSON block
-        json_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text)
-        if json_match:
-            return json_match.group(1).strip()
+        fence_start = text.find("```")
+        if fence_start != -1:
+            fence_end = text.find("```", fence_start + 3)
+            if fence_end != -1:
+                block = text[fence_start + 3:fence_end]
+                if block.startswith("json"):
+                    block = block[4:]
+                return block.strip()
 
         # Try to find raw JSON object
-        brace_match = re.search(r"\{[\s\S]*\}", text)
-        if brace_match:
-            return brace_match.group(0)
+        start = text.find("{")
+        if start != -1:
+            end = _matching_brace(text, start)
+            if end == -1:
+                # Unbalanced: fall back to the last closing brace
+                end = text.rfind("}")
+            if end > start:
+                return text[start:end + 1]
 
         return text.strip()
 
-    def call_api(self, prompt: str) -> dict:
+    async def call_api(self, prompt: str) -> dict:
         """Call OpenAI API and return parsed JSON."""
         kwargs = {
             "model": self.model,
@@ -136,7 +197,7 @@ class FeatureExtractor:
 
         log.debug(f"Calling API with model={self.model}, web_search={self.use_web_search}")
 
-        response = self.client.responses.create(**kwargs)
+        response = await self.client.responses.create(**kwargs)
 
         text = getattr(response, "output_text", None)
         if not text:
@@ -152,7 +213,7 @@ class FeatureExtractor:
             raise
 
     # Required features (31 total)
-    REQUIRED_FEATURES = [
+    REQUIRED_FEATURES = (
         # Coat & Allergens
         "shedding", "coat_type", "dander_level", "grooming",
         # Health
@@ -169,9 +230,13 @@ class FeatureExtractor:
         "trainability", "working_drive", "behavior_management_need", "mental_stimulation",
         # Hunting Instincts
         "prey_drive", "hunting_instinct"
-    ]
+    )
+
+    REQUIRED_PARAMETERS = ("weight_kg", "height_cm", "lifespan_years")
 
-    REQUIRED_PARAMETERS = ["weight_kg", "height_cm", "lifespan_years"]
+    # Fields every feature source entry must have (set form for one-shot difference)
+    REQUIRED_ENTRY_FIELDS = ("value", "confidence", "source")
+    REQUIRED_ENTRY_KEYS = frozenset(REQUIRED_ENTRY_FIELDS)
 
     def _validate_result(self, result: dict, breed_id: str) -> None:
         """Validate extracted result structure."""
@@ -188,12 +253,14 @@ class FeatureExtractor:
         missing_features = []
         invalid_features = []
 
+        required_keys = self.REQUIRED_ENTRY_KEYS
+
         for feat_id in self.REQUIRED_FEATURES:
-            if feat_id not in features:
+            feat_data = features.get(feat_id)
+            if feat_data is None and feat_id not in features:
                 missing_features.append(feat_id)
                 continue
 
-            feat_data = features[feat_id]
             if not isinstance(feat_data, list):
                 invalid_features.append(f"{feat_id}: expected array, got {type(feat_data).__name__}")
                 continue
@@ -203,18 +270,15 @@ class FeatureExtractor:
                 if not isinstance(entry, dict):
                     invalid_features.append(f"{feat_id}[{i}]: expected object, got {type(entry).__name__}")
                     continue
-                if "value" not in entry:
-                    invalid_features.append(f"{feat_id}[{i}]: missing 'value'")
-                if "confidence" not in entry:
-                    invalid_features.append(f"{feat_id}[{i}]: missing 'confidence'")
-                if "source" not in entry:
-                    invalid_features.append(f"{feat_id}[{i}]: missing 'source'")
+                missing_keys = required_keys - entry.keys()
+                if missing_keys:
+                    invalid_features.extend(
+                        f"{feat_id}[{i}]: missing '{key}'"
+                        for key in self.REQUIRED_ENTRY_FIELDS if key in missing_keys
+                    )
 
         # Check parameters structure
-        missing_params = []
-        for param_id in self.REQUIRED_PARAMETERS:
-            if param_id not in parameters:
-                missing_params.append(param_id)
+        missing_params = [p for p in self.REQUIRED_PARAMETERS if p not in parameters]
 
         # Log warnings but don't fail on missing features (LLM may not find all data)
         if missing_features:
@@ -224,7 +288,7 @@ class FeatureExtractor:
         if missing_params:
             log.warning(f"{breed_id}: missing parameters: {missing_params}")
 
-    def process_breed(self, breed: dict) -> dict | None:
+    async def process_breed(self, breed: dict) -> dict | None:
         """Process a single breed and return extracted features."""
         breed_id = breed["id"]
         output_file = OUTPUT_DIR / f"{breed_id}.json"
@@ -243,37 +307,91 @@ class FeatureExtractor:
         prompt = self.render_prompt(breed, breed_data)
 
         try:
-            result = self.call_api(prompt)
-
-            # Validate result structure
-            self._validate_result(result, breed_id)
-
-            # Save result
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-
-            log.info(f"[OK] {breed_id} - saved to {output_file.name}")
+            result = await self.call_api(prompt)
+            self._save_result(result, breed_id)
             return result
 
         except Exception as e:
             log.error(f"[ERROR] {breed_id}: {e}")
             return None
 
-    def run(
+    def _save_result(self, result: dict, breed_id: str) -> None:
+        """Validate an extracted result and write it to the breed's output file."""
+        self._validate_result(result, breed_id)
+
+        # Save result (serialize in one call: json.dump streams many small writes)
+        output_file = OUTPUT_DIR / f"{breed_id}.json"
+        output_file.write_text(
+            json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+        log.info(f"[OK] {breed_id} - saved to {output_file.name}")
+
+    async def process_batch(self, breeds: list[dict]) -> list[dict | None]:
+        """
+        Process several breeds with one API call.
+
+        Breeds missing from the response or failing validation are retried
+        one by one with process_breed. Returns one result per input breed.
+        """
+        pending = []
+        for breed in breeds:
+            if (OUTPUT_DIR / f"{breed['id']}.json").exists():
+                log.info(f"[SKIP] {breed['id']} - already extracted")
+            else:
+                pending.append(breed)
+
+        if len(pending) <= 1:
+            return [await self.process_breed(b) if b in pending else None for b in breeds]
+
+        batch_ids = [b["id"] for b in pending]
+        log.info(f"[EXTRACT] batch of {len(pending)}: {', '.join(batch_ids)}")
+
+        prompt = self.render_batch_prompt(
+            [(b, self.load_breed_source(b["id"])) for b in pending]
+        )
+
+        try:
+            response = await self.call_api(prompt)
+            batch_results = response.get("results", {})
+            if not isinstance(batch_results, dict):
+                raise ValueError("Response 'results' is not an object")
+        except Exception as e:
+            log.warning(f"[BATCH] {', '.join(batch_ids)}: {e}; retrying individually")
+            batch_results = {}
+
+        results = {}
+        for breed in pending:
+            breed_id = breed["id"]
+            result = batch_results.get(breed_id)
+            try:
+                if not isinstance(result, dict):
+                    raise ValueError("missing from batch response")
+                self._save_result(result, breed_id)
+                results[breed_id] = result
+            except Exception as e:
+                log.warning(f"[BATCH] {breed_id}: {e}; retrying individually")
+                results[breed_id] = await self.process_breed(breed)
+
+        return [results.get(b["id"]) for b in breeds]
+
+    async def run(
         self,
         breed_id: str | None = None,
         limit: int | None = None,
         dry_run: bool = False
     ) -> dict[str, Any]:
-        """Run extraction for breeds."""
+        """Run extraction for breeds, up to max_concurrency API calls at a time."""
         breeds = self.load_breeds()
 
         # Filter by breed_id if specified
         if breed_id:
-            breeds = [b for b in breeds if b["id"] == breed_id]
-            if not breeds:
+            # Stop at the first match instead of scanning the whole catalog
+            breed = next((b for b in breeds if b["id"] == breed_id), None)
+            if breed is None:
                 log.error(f"Breed not found: {breed_id}")
                 return {"processed": 0, "errors": 1}
+            breeds = [breed]
 
         # Apply limit
         if limit:
@@ -289,9 +407,38 @@ class FeatureExtractor:
 
         results = {"processed": 0, "skipped": 0, "errors": 0}
 
-        for breed in breeds:
-            result = self.process_breed(breed)
-            if result is None:
+        # Calls are I/O-bound: overlap them, bounded to respect rate limits
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def guarded(batch: list[dict]) -> list[dict | None]:
+            async with semaphore:
+                if len(batch) == 1:
+                    return [await self.process_breed(batch[0])]
+                return await self.process_batch(batch)
+
+        # Group breeds so one request covers batch_size of them
+        batches = [
+            breeds[i:i + self.batch_size]
+            for i in range(0, len(breeds), self.batch_size)
+        ]
+
+        batch_outcomes = await asyncio.gather(
+            *(guarded(batch) for batch in batches),
+            return_exceptions=True
+        )
+
+        outcomes = []
+        for batch, batch_outcome in zip(batches, batch_outcomes):
+            if isinstance(batch_outcome, Exception):
+                outcomes.extend([batch_outcome] * len(batch))
+            else:
+                outcomes.extend(batch_outcome)
+
+        for breed, result in zip(breeds, outcomes):
+            if isinstance(result, Exception):
+                log.error(f"[ERROR] {breed['id']}: {result}")
+                results["errors"] += 1
+            elif result is None:
                 if (OUTPUT_DIR / f"{breed['id']}.json").exists():
                     results["skipped"] += 1
                 else:
@@ -310,6 +457,7 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Show what would be processed")
     parser.add_argument("--model", type=str, default="gpt-4.1", help="OpenAI model to use")
     parser.add_argument("--no-web-search", action="store_true", help="Disable web search")
+    parser.add_argument("--batch-size", type=int, help="Breeds per API request (default: config extraction.batch_size)")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
 
     args = parser.parse_args()
@@ -319,14 +467,21 @@ def main():
 
     extractor = FeatureExtractor(
         model=args.model,
-        use_web_search=not args.no_web_search
+        use_web_search=not args.no_web_search,
+        batch_size=args.batch_size
     )
 
-    results = extractor.run(
-        breed_id=args.breed,
-        limit=args.limit,
-        dry_run=args.dry_run
-    )
+    async def run_extraction() -> dict[str, Any]:
+        try:
+            return await extractor.run(
+                breed_id=args.breed,
+                limit=args.limit,
+                dry_run=args.dry_run
+            )
+        finally:
+            await extractor.close()
+
+    results = asyncio.run(run_extraction())
 
     sys.exit(0 if results.get("errors", 0) == 0 else 1)
 
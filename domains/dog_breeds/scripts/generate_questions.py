@@ -6,37 +6,45 @@ Usage:
     python generate_questions.py                    # Process all needs
     python generate_questions.py --need hypoallergenic  # Process single need
     python generate_questions.py --dry-run          # Show what would be processed
+    python generate_questions.py --concurrency 4    # At most 4 API calls in flight
+    python generate_questions.py --batch            # Submit via the Batch API (cheaper, async)
+    python generate_questions.py --batch-size 5     # Generate 5 needs per API request
 """
 
+import asyncio
+import hashlib
 import json
 import os
 import re
 import sys
-import argparse
 import logging
 from pathlib import Path
 from typing import Any
 
-from openai import OpenAI
-from dotenv import load_dotenv
-from jinja2 import Environment, FileSystemLoader
-
 # Setup paths
 SCRIPT_DIR = Path(__file__).parent
 DOMAIN_DIR = SCRIPT_DIR.parent
 CONFIG_FILE = DOMAIN_DIR / "config.json"
 
 
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write text via a temp file and os.replace, so a crash never leaves a partial file."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
 def load_config() -> dict:
     """Load domain config."""
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return json.loads(CONFIG_FILE.read_bytes())
 
 
 CONFIG = load_config()
 PROMPTS_DIR = DOMAIN_DIR / CONFIG["paths"]["prompts"]
 CONTENT_DIR = DOMAIN_DIR / CONFIG["paths"]["content"]
 OUTPUT_DIR = DOMAIN_DIR / CONFIG["paths"]["questions"]
+# Raw model responses keyed by prompt hash (git-ignored)
+PROMPT_CACHE_DIR = DOMAIN_DIR / "cache" / "prompts"
 
 # Logging setup
 logging.basicConfig(
@@ -46,11 +54,56 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Response JSON extraction: fenced block, else outermost braces
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)```")
+_BRACE_RE = re.compile(r"\{[\s\S]*\}")
+_JSON_DECODER = json.JSONDecoder()
+
+# Batch API polling
+BATCH_POLL_INTERVAL = 30  # seconds
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def print_plan(needs: list[dict], blocks_by_id: dict[str, dict]) -> None:
+    """Print whether each need would be generated or skipped."""
+    for n in needs:
+        status = "SKIP" if (OUTPUT_DIR / f"{n['id']}.json").exists() else "PROCESS"
+        block_name = blocks_by_id.get(n["block"], {}).get("name", n["block"])
+        print(f"[{status}] {n['id']} ({block_name})")
+
+
+def dry_run(need_id: str | None = None) -> dict[str, Any]:
+    """Show what would be processed, without an API client or prompt templates."""
+    data = json.loads((CONTENT_DIR / "user_needs.json").read_bytes())
+    needs = data["needs"]
+
+    if need_id:
+        needs = [n for n in needs if n["id"] == need_id]
+        if not needs:
+            log.error(f"Need not found: {need_id}")
+            return {"processed": 0, "errors": 1}
+
+    log.info(f"Processing {len(needs)} needs (dry_run=True)")
+    print_plan(needs, {b["id"]: b for b in data["blocks"]})
+    return {"processed": 0, "would_process": len(needs)}
+
 
 class QuestionGenerator:
     """Generate questions for user needs using OpenAI API."""
 
-    def __init__(self, model: str | None = None):
+    def __init__(
+        self,
+        model: str | None = None,
+        concurrency: int | None = None,
+        use_cache: bool = True,
+        batch_size: int | None = None
+    ):
+        # Heavy client/template deps are imported only when generating,
+        # so --help and --dry-run start without them
+        from dotenv import load_dotenv
+        from jinja2 import Environment, FileSystemLoader
+        from openai import AsyncOpenAI
+
         load_dotenv()
 
         if not os.getenv("OPENAI_API_KEY"):
@@ -61,37 +114,69 @@ class QuestionGenerator:
         self.temperature = llm_config["temperature"]["generation"]
         timeout = llm_config["timeout"]
         max_retries = llm_config["max_retries"]
+        self.max_concurrency = max(1, concurrency or llm_config.get("max_concurrency", 8))
+        self.batch_size = max(1, batch_size or CONFIG["questions"].get("batch_size", 1))
 
-        self.client = OpenAI(timeout=timeout, max_retries=max_retries)
+        # The SDK already retries transient errors with exponential backoff
+        self.client = AsyncOpenAI(timeout=timeout, max_retries=max_retries)
 
-        # Setup Jinja2
+        # Setup Jinja2 (template compiled once; no per-render mtime checks)
         self.jinja_env = Environment(
             loader=FileSystemLoader(str(PROMPTS_DIR)),
             trim_blocks=True,
-            lstrip_blocks=True
+            lstrip_blocks=True,
+            auto_reload=False
         )
+        self.prompt_template = self.jinja_env.get_template("generate_questions.prompt.md")
+        self.batch_template = self.jinja_env.get_template("generate_questions_batch.prompt.md")
 
-        # Ensure output directory exists
+        self.use_cache = use_cache
+
+        # Ensure output directories exist
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        if use_cache:
+            PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    def cache_path(self, prompt: str) -> Path:
+        """Prompt cache file for this model, temperature and prompt."""
+        key = hashlib.sha256(f"{self.model}|{self.temperature}|{prompt}".encode("utf-8")).hexdigest()
+        return PROMPT_CACHE_DIR / f"{key}.txt"
+
+    def cached_response(self, prompt: str) -> str | None:
+        """Return the cached response text for prompt, if any."""
+        if not self.use_cache:
+            return None
+        try:
+            return self.cache_path(prompt).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def store_response(self, prompt: str, text: str) -> None:
+        """Cache a response text that parsed successfully."""
+        if self.use_cache:
+            self.cache_path(prompt).write_text(text, encoding="utf-8")
+
+    def evict_response(self, prompt: str) -> None:
+        """Drop a cached response (e.g. it failed validation) so it is regenerated."""
+        if self.use_cache:
+            self.cache_path(prompt).unlink(missing_ok=True)
 
     def load_user_needs(self) -> dict:
         """Load user_needs.json."""
         needs_file = CONTENT_DIR / "user_needs.json"
-        with open(needs_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return json.loads(needs_file.read_bytes())
 
     def load_object_features(self) -> dict:
         """Load object_features.json with breed characteristics."""
         features_file = CONTENT_DIR / "object_features.json"
-        with open(features_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return json.loads(features_file.read_bytes())
 
-    def get_block_info(self, block_id: str, blocks: list[dict]) -> dict:
-        """Get block name and description by ID."""
-        for block in blocks:
-            if block["id"] == block_id:
-                return block
-        return {"id": block_id, "name": block_id, "description": ""}
+    def get_block_info(self, block_id: str, blocks_by_id: dict[str, dict]) -> dict:
+        """Get block name and description by ID (blocks_by_id: block id -> block)."""
+        block = blocks_by_id.get(block_id)
+        if block is None:
+            return {"id": block_id, "name": block_id, "description": ""}
+        return block
 
     def render_prompt(
         self,
@@ -101,8 +186,7 @@ class QuestionGenerator:
         object_features: dict
     ) -> str:
         """Render the question generation prompt."""
-        template = self.jinja_env.get_template("generate_questions.prompt.md")
-        return template.render(
+        return self.prompt_template.render(
             need_id=need["id"],
             need_name=need["name"],
             need_description=need["description"],
@@ -115,34 +199,78 @@ class QuestionGenerator:
             lifespan_group=object_features["lifespan_group"]
         )
 
+    def render_batch_prompt(
+        self,
+        items: list[tuple[dict, dict]],
+        questions_count: int,
+        object_features: dict
+    ) -> str:
+        """Render the question generation prompt for several (need, block_info) pairs."""
+        return self.batch_template.render(
+            needs=[
+                {
+                    "need_id": need["id"],
+                    "need_name": need["name"],
+                    "need_description": need["description"],
+                    "block_name": block_info["name"],
+                    "block_description": block_info.get("description", ""),
+                }
+                for need, block_info in items
+            ],
+            questions_count=questions_count,
+            features=object_features["features"],
+            size_group=object_features["size_group"],
+            height_group=object_features["height_group"],
+            lifespan_group=object_features["lifespan_group"]
+        )
+
     def extract_json(self, text: str) -> str:
         """Extract JSON from model response."""
         # Try to find JSON block
-        json_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text)
+        json_match = _FENCE_RE.search(text)
         if json_match:
             return json_match.group(1).strip()
 
         # Try to find raw JSON object
-        brace_match = re.search(r"\{[\s\S]*\}", text)
+        brace_match = _BRACE_RE.search(text)
         if brace_match:
             return brace_match.group(0)
 
         return text.strip()
 
-    def call_api(self, prompt: str) -> dict:
-        """Call OpenAI API and return parsed JSON."""
+    async def call_api(self, prompt: str) -> dict:
+        """Call OpenAI API (or reuse a cached response) and return parsed JSON."""
+        text = self.cached_response(prompt)
+        if text is not None:
+            log.debug("Using cached response")
+            return self.parse_response(text)
+
         log.debug(f"Calling API with model={self.model}")
 
-        response = self.client.responses.create(
+        response = await self.client.responses.create(
             model=self.model,
             input=prompt,
             temperature=self.temperature,
         )
 
         text = getattr(response, "output_text", None)
+        result = self.parse_response(text)
+        self.store_response(prompt, text)
+        return result
+
+    def parse_response(self, text: str | None) -> dict:
+        """Parse the JSON object from a model response text."""
         if not text:
             raise RuntimeError("Empty response from API")
 
+        # Well-formed replies are a bare object: decode without regex scans
+        stripped = text.lstrip()
+        if stripped.startswith("{"):
+            try:
+                return _JSON_DECODER.raw_decode(stripped)[0]
+            except json.JSONDecodeError:
+                pass
+
         json_str = self.extract_json(text)
 
         try:
@@ -152,7 +280,7 @@ class QuestionGenerator:
             log.error(f"Raw response: {text[:500]}...")
             raise
 
-    def process_need(
+    async def process_need(
         self,
         need: dict,
         block_info: dict,
@@ -174,41 +302,228 @@ class QuestionGenerator:
         prompt = self.render_prompt(need, block_info, questions_count, object_features)
 
         try:
-            result = self.call_api(prompt)
+            result = await self.call_api(prompt)
+            return await self.save_result(result, need, block_info)
+
+        except Exception as e:
+            log.error(f"[ERROR] {need_id}: {e}")
+            self.evict_response(prompt)
+            return None
 
-            # Validate result structure
-            if "questions" not in result:
-                raise ValueError("Response missing 'questions' field")
-            if "formula" not in result:
-                raise ValueError("Response missing 'formula' field")
+    async def process_need_group(
+        self,
+        items: list[tuple[dict, dict]],
+        questions_count: int,
+        object_features: dict
+    ) -> list[dict | None]:
+        """
+        Process several (need, block_info) pairs with one API call.
+
+        Needs missing from the response or failing validation are retried
+        one by one with process_need. Returns one result per input need.
+        """
+        pending = []
+        for need, block_info in items:
+            if (OUTPUT_DIR / f"{need['id']}.json").exists():
+                log.info(f"[SKIP] {need['id']} - already generated")
+            else:
+                pending.append((need, block_info))
 
-            # Add metadata
-            result["need_id"] = need_id
-            result["need_name"] = need["name"]
-            result["need_description"] = need["description"]
-            result["block"] = block_info["id"]
-            result["answer_options"] = CONFIG["questions"]["answer_options"]
+        if len(pending) <= 1:
+            return [
+                await self.process_need(need, block_info, questions_count, object_features)
+                if (need, block_info) in pending else None
+                for need, block_info in items
+            ]
 
-            # Save result
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+        group_ids = [need["id"] for need, _ in pending]
+        log.info(f"[GENERATE] group of {len(pending)}: {', '.join(group_ids)}")
 
-            log.info(f"[OK] {need_id} - {len(result['questions'])} questions generated")
-            return result
+        prompt = self.render_batch_prompt(pending, questions_count, object_features)
 
+        try:
+            response = await self.call_api(prompt)
+            if not isinstance(response, dict):
+                raise ValueError("Response is not a JSON object")
         except Exception as e:
-            log.error(f"[ERROR] {need_id}: {e}")
-            return None
+            log.warning(f"[GROUP] {', '.join(group_ids)}: {e}; retrying individually")
+            self.evict_response(prompt)
+            response = {}
+
+        results = {}
+        failed = False
+        for need, block_info in pending:
+            need_id = need["id"]
+            result = response.get(need_id)
+            try:
+                if not isinstance(result, dict):
+                    raise ValueError("missing from group response")
+                results[need_id] = await self.save_result(result, need, block_info)
+            except Exception as e:
+                log.warning(f"[GROUP] {need_id}: {e}; retrying individually")
+                failed = True
+                results[need_id] = await self.process_need(
+                    need, block_info, questions_count, object_features
+                )
+
+        # Keep only fully valid group responses in the prompt cache
+        if failed:
+            self.evict_response(prompt)
+
+        return [results.get(need["id"]) for need, _ in items]
+
+    async def save_result(self, result: dict, need: dict, block_info: dict) -> dict:
+        """Validate a generated result, add need metadata and write it to disk."""
+        need_id = need["id"]
 
-    def run(
+        # Validate result structure
+        if "questions" not in result:
+            raise ValueError("Response missing 'questions' field")
+        if "formula" not in result:
+            raise ValueError("Response missing 'formula' field")
+
+        # Add metadata
+        result["need_id"] = need_id
+        result["need_name"] = need["name"]
+        result["need_description"] = need["description"]
+        result["block"] = block_info["id"]
+        result["answer_options"] = CONFIG["questions"]["answer_options"]
+
+        # Save result
+        output_file = OUTPUT_DIR / f"{need_id}.json"
+        await asyncio.to_thread(
+            atomic_write_text, output_file, json.dumps(result, ensure_ascii=False, indent=2)
+        )
+
+        log.info(f"[OK] {need_id} - {len(result['questions'])} questions generated")
+        return result
+
+    @staticmethod
+    def batch_output_text(body: dict) -> str:
+        """Join the output_text parts of a raw Responses API body (as in Batch output)."""
+        return "".join(
+            part.get("text", "")
+            for item in body.get("output", [])
+            if item.get("type") == "message"
+            for part in item.get("content", [])
+            if part.get("type") == "output_text"
+        )
+
+    async def run_batch(
+        self,
+        needs: list[dict],
+        blocks_by_id: dict[str, dict],
+        questions_count: int,
+        object_features: dict
+    ) -> list[dict | None]:
+        """
+        Generate questions for needs through the OpenAI Batch API.
+
+        All prompts go into one JSONL batch (custom_id = need id); the script
+        polls until the batch finishes and saves each result like process_need.
+        Returns one result per need (None for skipped or failed needs).
+        """
+        results = {}
+        pending = {}
+        for need in needs:
+            if (OUTPUT_DIR / f"{need['id']}.json").exists():
+                log.info(f"[SKIP] {need['id']} - already generated")
+                continue
+
+            block_info = self.get_block_info(need["block"], blocks_by_id)
+            prompt = self.render_prompt(need, block_info, questions_count, object_features)
+
+            # Answer from the prompt cache without submitting
+            text = self.cached_response(prompt)
+            if text is not None:
+                try:
+                    results[need["id"]] = await self.save_result(self.parse_response(text), need, block_info)
+                    continue
+                except Exception as e:
+                    log.warning(f"[CACHE] {need['id']}: {e}; regenerating")
+                    self.evict_response(prompt)
+
+            pending[need["id"]] = (need, block_info, prompt)
+
+        if not pending:
+            return [results.get(n["id"]) for n in needs]
+
+        lines = []
+        for need, block_info, prompt in pending.values():
+            lines.append(json.dumps({
+                "custom_id": need["id"],
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": {
+                    "model": self.model,
+                    "input": prompt,
+                    "temperature": self.temperature,
+                },
+            }, ensure_ascii=False))
+
+        batch_input = await self.client.files.create(
+            file=("generate_questions.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint="/v1/responses",
+            completion_window="24h"
+        )
+        log.info(f"[BATCH] {batch.id} submitted with {len(pending)} needs")
+
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            batch = await self.client.batches.retrieve(batch.id)
+            log.debug(f"[BATCH] {batch.id} status={batch.status}")
+
+        if batch.status != "completed" or not batch.output_file_id:
+            log.error(f"[BATCH] {batch.id} ended with status={batch.status}")
+            return [results.get(n["id"]) for n in needs]
+
+        output = await self.client.files.content(batch.output_file_id)
+
+        seen = set()
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            need_id = record.get("custom_id")
+            if need_id not in pending:
+                continue
+            seen.add(need_id)
+            need, block_info, prompt = pending[need_id]
+
+            try:
+                response = record.get("response") or {}
+                if response.get("status_code") != 200:
+                    raise RuntimeError(record.get("error") or f"status {response.get('status_code')}")
+                text = self.batch_output_text(response.get("body", {}))
+                results[need_id] = await self.save_result(self.parse_response(text), need, block_info)
+                self.store_response(prompt, text)
+            except Exception as e:
+                log.error(f"[ERROR] {need_id}: {e}")
+
+        # Requests that failed entirely are reported in the batch error file
+        for need_id in pending.keys() - seen:
+            log.error(f"[ERROR] {need_id}: no successful result in batch {batch.id}")
+
+        return [results.get(n["id"]) for n in needs]
+
+    async def run(
         self,
         need_id: str | None = None,
-        dry_run: bool = False
+        dry_run: bool = False,
+        batch: bool = False
     ) -> dict[str, Any]:
-        """Run question generation for needs."""
+        """
+        Run question generation for needs, up to max_concurrency API calls at a time.
+
+        With batch=True all needs are submitted as one Batch API job instead.
+        """
         data = self.load_user_needs()
         needs = data["needs"]
-        blocks = data["blocks"]
+        blocks_by_id = {b["id"]: b for b in data["blocks"]}
         questions_count = CONFIG["questions"]["per_need"]
 
         # Load breed features for formula generation
@@ -226,19 +541,47 @@ class QuestionGenerator:
         log.info(f"Processing {len(needs)} needs (dry_run={dry_run})")
 
         if dry_run:
-            for n in needs:
-                status = "SKIP" if (OUTPUT_DIR / f"{n['id']}.json").exists() else "PROCESS"
-                block_info = self.get_block_info(n["block"], blocks)
-                print(f"[{status}] {n['id']} ({block_info['name']})")
+            print_plan(needs, blocks_by_id)
             return {"processed": 0, "would_process": len(needs)}
 
         results = {"processed": 0, "skipped": 0, "errors": 0}
 
-        for need in needs:
-            block_info = self.get_block_info(need["block"], blocks)
-            result = self.process_need(need, block_info, questions_count, object_features)
+        if batch:
+            outcomes = await self.run_batch(needs, blocks_by_id, questions_count, object_features)
+        else:
+            # Calls are I/O-bound: overlap them, bounded to respect rate limits
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def guarded(group: list[dict]) -> list[dict | None]:
+                items = [(n, self.get_block_info(n["block"], blocks_by_id)) for n in group]
+                async with semaphore:
+                    if len(items) == 1:
+                        return [await self.process_need(*items[0], questions_count, object_features)]
+                    return await self.process_need_group(items, questions_count, object_features)
+
+            # Group needs so one request covers batch_size of them
+            groups = [
+                needs[i:i + self.batch_size]
+                for i in range(0, len(needs), self.batch_size)
+            ]
+
+            group_outcomes = await asyncio.gather(
+                *(guarded(group) for group in groups),
+                return_exceptions=True
+            )
+
+            outcomes = []
+            for group, group_outcome in zip(groups, group_outcomes):
+                if isinstance(group_outcome, Exception):
+                    outcomes.extend([group_outcome] * len(group))
+                else:
+                    outcomes.extend(group_outcome)
 
-            if result is None:
+        for need, result in zip(needs, outcomes):
+            if isinstance(result, Exception):
+                log.error(f"[ERROR] {need['id']}: {result}")
+                results["errors"] += 1
+            elif result is None:
                 if (OUTPUT_DIR / f"{need['id']}.json").exists():
                     results["skipped"] += 1
                 else:
@@ -251,10 +594,16 @@ class QuestionGenerator:
 
 
 def main():
+    import argparse
+
     parser = argparse.ArgumentParser(description="Generate questions for user needs")
     parser.add_argument("--need", type=str, help="Process single need by ID")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be processed")
     parser.add_argument("--model", type=str, default="gpt-4.1", help="OpenAI model to use")
+    parser.add_argument("--concurrency", type=int, help="Max concurrent API calls (default: config llm.max_concurrency)")
+    parser.add_argument("--batch", action="store_true", help="Submit all needs as one OpenAI Batch API job")
+    parser.add_argument("--batch-size", type=int, help="Needs per real-time API request (default: config questions.batch_size)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not write the prompt response cache")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
 
     args = parser.parse_args()
@@ -262,13 +611,22 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    generator = QuestionGenerator(model=args.model)
+    if args.dry_run:
+        results = dry_run(args.need)
+        sys.exit(0 if results.get("errors", 0) == 0 else 1)
 
-    results = generator.run(
-        need_id=args.need,
-        dry_run=args.dry_run
+    generator = QuestionGenerator(
+        model=args.model,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        batch_size=args.batch_size
     )
 
+    results = asyncio.run(generator.run(
+        need_id=args.need,
+        batch=args.batch
+    ))
+
     sys.exit(0 if results.get("errors", 0) == 0 else 1)
 
 
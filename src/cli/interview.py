@@ -5,9 +5,12 @@ Interactive dog breed recommendation interview.
 Run: python interview.py
 """
 
+import functools
 import json
 import random
 import sys
+from collections import deque
+from collections.abc import Mapping
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).parent
@@ -54,73 +57,94 @@ from core.models.user_profile import UserProfile
 
 # Load config
 CONFIG_FILE = DOMAIN_DIR / "config.json"
-with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-    CONFIG = json.load(f)
+CONFIG = json.loads(CONFIG_FILE.read_bytes())
 
 
+# Content loaders parse each file once per process; results are shared, do not mutate
+@functools.lru_cache(maxsize=1)
 def load_questions() -> dict[str, dict]:
     """Load all question files."""
     questions_dir = DOMAIN_DIR / "questions"
     questions = {}
     for fpath in questions_dir.glob("*.json"):
-        with open(fpath, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(fpath.read_bytes())
         questions[data["need_id"]] = data
     return questions
 
 
+@functools.lru_cache(maxsize=1)
 def load_breeds_names() -> dict[str, str]:
     """Load breed display names."""
     breeds_file = DOMAIN_DIR / "content" / "breeds.json"
-    with open(breeds_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = json.loads(breeds_file.read_bytes())
     return {b["id"]: b.get("name_ru") or b["name_en"] for b in data["breeds"]}
 
 
+@functools.lru_cache(maxsize=1)
 def load_needs_names() -> dict[str, str]:
     """Load need display names."""
     needs_file = DOMAIN_DIR / "content" / "user_needs.json"
-    with open(needs_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = json.loads(needs_file.read_bytes())
     return {n["id"]: n["name"] for n in data["needs"]}
 
 
+# Score bars for 0..20 cells (score * 20), built once
+SCORE_BARS = tuple("█" * i for i in range(21))
+
+
+def write_lines(lines: list[str]) -> None:
+    """Write a block of lines to stdout in one call (one flush per screen section)."""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
 def clear_screen():
     print("\033[2J\033[H", end="")
 
 
 def print_header(step: int, total_questions: int):
-    print("=" * 60)
-    print(f"  Подбор породы собаки  |  Вопрос {step}")
-    print("=" * 60)
-    print()
-
-
-def print_top_breeds(matcher: BreedMatcher, profile: UserProfile, breed_names: dict, top_k: int = 5, equal_weights: bool = False):
-    needs = profile.get_needs()
+    write_lines([
+        "=" * 60,
+        f"  Подбор породы собаки  |  Вопрос {step}",
+        "=" * 60,
+        "",
+    ])
+
+
+def print_top_breeds(matcher: BreedMatcher, profile: UserProfile, breed_names: dict, top_k: int = 5, equal_weights: bool = False,
+                     needs: Mapping | None = None):
+    if needs is None:
+        needs = profile.get_needs()
     if not needs:
         print("  (ответьте на первый вопрос)")
         return
 
     results = matcher.match_fast(needs, top_k=top_k, equal_weights=equal_weights)
 
-    print(f"  Топ-{top_k} пород:")
+    lines = [f"  Топ-{top_k} пород:"]
     for i, (breed_id, score) in enumerate(results, 1):
         name = breed_names.get(breed_id, breed_id)
-        bar = "█" * int(score * 20)
-        print(f"  {i}. {name:<30} {score:.2f} {bar}")
-    print()
+        bar = SCORE_BARS[max(0, min(20, int(score * 20)))]  # negative scores get no bar
+        lines.append(f"  {i}. {name:<30} {score:.2f} {bar}")
+    lines.append("")
+    write_lines(lines)
+
+
+# Static answer legend shown under every question
+ANSWER_MENU = [
+    "  Ответы:",
+    "    1 или д  - Да",
+    "    2 или н  - Нет",
+    "    3 или ?  - Не знаю",
+    "    4 или -  - Мне всё равно",
+    "    q        - Выход",
+    "",
+]
 
 
 def get_answer() -> str | None:
     """Get user's answer."""
-    print("  Ответы:")
-    print("    1 или д  - Да")
-    print("    2 или н  - Нет")
-    print("    3 или ?  - Не знаю")
-    print("    4 или -  - Мне всё равно")
-    print("    q        - Выход")
-    print()
+    write_lines(ANSWER_MENU)
 
     while True:
         try:
@@ -163,24 +187,25 @@ def main():
 
     step = 1
     exhausted_needs: set[str] = set()  # Needs with all questions asked
+    confident_needs: set[str] = set()  # Needs with confidence >= threshold (kept per answer)
+    question_pools: dict[str, deque] = {}  # need_id -> not yet asked questions, shuffled
     confidence_threshold = CONFIG["fuzzy"]["threshold"]["high"]  # Stop asking when confidence >= this
 
     while True:
         clear_screen()
         print_header(step, len(questions))
 
+        # Current needs vector, shared by the ranking and question selection below
+        needs = profile.get_needs()
+
         # Show current top breeds
-        print_top_breeds(matcher, profile, breed_names, equal_weights=equal_weights)
+        print_top_breeds(matcher, profile, breed_names, equal_weights=equal_weights, needs=needs)
 
         # Build excluded set: exhausted needs + needs with high confidence + independent
-        confident_needs = {
-            nid for nid in profile.get_needs()
-            if profile.get_need_confidence(nid) >= confidence_threshold
-        }
         excluded = exhausted_needs | confident_needs | profile._independent
 
         best_need, split_score = matcher.select_next_question(
-            profile.get_needs(),
+            needs,
             excluded,
             equal_weights=equal_weights
         )
@@ -201,25 +226,31 @@ def main():
             print(f"  Ошибка: вопросы для {best_need} не найдены")
             break
 
-        # Get unanswered questions for this need
-        all_q = q_data.get("questions", [])
-        unanswered = [q for q in all_q if not profile.is_question_asked(q.get("id", ""))]
+        # Unanswered questions for this need in random order (pool built on first use)
+        pool = question_pools.get(best_need)
+        if pool is None:
+            unanswered = profile.get_unanswered_questions(best_need, q_data.get("questions", []))
+            pool = question_pools[best_need] = deque(random.sample(unanswered, len(unanswered)))
 
         # If all questions for this need are asked, mark as exhausted and retry
-        if not unanswered:
+        if not pool:
             exhausted_needs.add(best_need)
             continue
 
-        # Pick a random unanswered question
-        question = random.choice(unanswered)
+        # Take the next random unanswered question; exclude the need once its pool is empty
+        question = pool.popleft()
+        if not pool:
+            exhausted_needs.add(best_need)
         question_id = question.get("id", f"{best_need}_q{random.randint(1,100)}")
         weight = question.get("weight", 1.0)
 
-        print(f"  {question['text']}")
-        print()
         confidence = profile.get_need_confidence(best_need)
-        print(f"  (потребность: {q_data['need_name']}, вес: {weight:.1f}, conf: {confidence:.2f})")
-        print()
+        write_lines([
+            f"  {question['text']}",
+            "",
+            f"  (потребность: {q_data['need_name']}, вес: {weight:.1f}, conf: {confidence:.2f})",
+            "",
+        ])
 
         # Get answer
         answer = get_answer()
@@ -232,6 +263,12 @@ def main():
         profile.add_answer(best_need, answer, question["text"], question_id, weight)
         step += 1
 
+        # Only the answered need's confidence can have changed
+        if profile.get_need_confidence(best_need) >= confidence_threshold:
+            confident_needs.add(best_need)
+        else:
+            confident_needs.discard(best_need)
+
     # Final results
     print()
     print("=" * 60)
@@ -242,9 +279,11 @@ def main():
     print_top_breeds(matcher, profile, breed_names, top_k=25, equal_weights=equal_weights)
 
     # Needs report
-    print("  Профиль потребностей:")
-    print(f"  {'Потребность':<30} {'T':>5} {'F':>5} {'T-F':>6} {'Conf':>5} {'Состояние':<8}")
-    print(f"  {'-'*30} {'-'*5} {'-'*5} {'-'*6} {'-'*5} {'-'*8}")
+    lines = [
+        "  Профиль потребностей:",
+        f"  {'Потребность':<30} {'T':>5} {'F':>5} {'T-F':>6} {'Conf':>5} {'Состояние':<8}",
+        f"  {'-'*30} {'-'*5} {'-'*5} {'-'*6} {'-'*5} {'-'*8}",
+    ]
 
     for need_id, val in sorted(profile.get_needs().items(), key=lambda x: x[1].t - x[1].f, reverse=True):
         conf = profile.get_need_confidence(need_id)
@@ -256,19 +295,20 @@ def main():
         else:
             state_ru = "~"
         name = need_names.get(need_id, need_id)
-        print(f"  {name:<30} {val.t:>5.2f} {val.f:>5.2f} {score:>+6.2f} {conf:>5.2f} {state_ru:<8}")
+        lines.append(f"  {name:<30} {val.t:>5.2f} {val.f:>5.2f} {score:>+6.2f} {conf:>5.2f} {state_ru:<8}")
 
     if profile._independent:
         independent_names = [need_names.get(nid, nid) for nid in profile._independent]
-        print(f"\n  Безразличны: {', '.join(independent_names)}")
-    print()
+        lines.append(f"\n  Безразличны: {', '.join(independent_names)}")
+    lines.append("")
 
-    print("  История ответов:")
+    lines.append("  История ответов:")
     for ans in profile.get_answer_history():
         symbol = {"true": "✓", "false": "✗", "unknown": "?", "independent": "-"}[ans.answer_type]
         name = need_names.get(ans.need_id, ans.need_id)
-        print(f"    [{symbol}] {name} (w={ans.weight:.1f})")
-    print()
+        lines.append(f"    [{symbol}] {name} (w={ans.weight:.1f})")
+    lines.append("")
+    write_lines(lines)
 
     # Save profile to file
     save_profile(profile)
@@ -285,13 +325,13 @@ def save_profile(profile: UserProfile) -> Path:
     filename = f"interview_{timestamp}.json"
     filepath = data_dir / filename
 
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(profile.to_dict(), f, ensure_ascii=False, indent=2)
+    # Serialize once; both files get the same text
+    text = json.dumps(profile.to_dict(), ensure_ascii=False, indent=2)
+    filepath.write_text(text, encoding="utf-8")
 
     # Also save as "latest" for easy access
     latest_path = data_dir / "interview_latest.json"
-    with open(latest_path, "w", encoding="utf-8") as f:
-        json.dump(profile.to_dict(), f, ensure_ascii=False, indent=2)
+    latest_path.write_text(text, encoding="utf-8")
 
     print(f"  Результаты сохранены: {filepath.name}")
     print(f"  (также: {latest_path.name})")
@@ -5,31 +5,62 @@ Uses LLM (OSS-120B via Nebius API) to generate human-friendly explanations
 of why a particular breed matches user's needs.
 """
 
+import asyncio
+import functools
+import hashlib
+import heapq
 import json
+import math
 import os
+import re
+import sys
+import tempfile
+import time
+import weakref
+from collections.abc import Iterator
 from dataclasses import dataclass
 from pathlib import Path
-
-from openai import OpenAI
+from types import MappingProxyType
+from typing import TYPE_CHECKING
 
 from .matcher import BreedMatcher
 from ..models.user_profile import UserProfile
 
+if TYPE_CHECKING:
+    # openai is imported lazily by get_client / get_async_client
+    from openai import AsyncOpenAI, OpenAI
+
 
 # Blocks that represent hard constraints (facts about user's situation)
 # vs soft preferences (what user would like)
-CONSTRAINT_BLOCKS = {"size_constraints", "housing_environment"}
+CONSTRAINT_BLOCKS = frozenset({"size_constraints", "housing_environment"})
 
 # Paths (relative to this file)
 PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
 DOMAIN_DIR = PROJECT_ROOT / "domains" / "dog_breeds"
 DATA_DIR = PROJECT_ROOT / "data"
 
+# LLM endpoint (OpenAI-compatible Nebius API)
+NEBIUS_BASE_URL = "https://api.tokenfactory.nebius.com/v1/"
+EXPLANATION_MODEL = "openai/gpt-oss-120b"
+
+# Opt-in on-disk cache of LLM responses (enable with EXPLAIN_CACHE=1)
+CACHE_DIR = DOMAIN_DIR / "cache"
+
+# Shared API clients, created lazily (see get_client / get_async_client)
+_client: "OpenAI | None" = None
+_aclient: "AsyncOpenAI | None" = None
+
+_EMPTY_MAP = MappingProxyType({})
+
+# Variables are identifiers like: apartment_ok, barking, size_small
+_FORMULA_VAR_RE = re.compile(r'[a-z_][a-z0-9_]*')
+
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> dict:
-    """Load domain config."""
-    with open(DOMAIN_DIR / "config.json", encoding="utf-8") as f:
-        return json.load(f)
+    """Load domain config (parsed once; shared, do not mutate)."""
+    return _read_json(DOMAIN_DIR / "config.json")
 
 
 @dataclass
@@ -42,6 +73,15 @@ class UserNeed:
     score_0_9: int = 0  # Normalized importance score (0-9)
 
 
+@dataclass(slots=True)
+class NeedMatch:
+    """How a breed matches a single user need."""
+    need_name: str
+    components: dict[str, int]  # formula variable -> normalized value (0-9)
+    is_match: bool
+    score_0_9: int = 0  # Normalized match score (0-9)
+
+
 @dataclass
 class BreedRecommendation:
     """Data for a single breed recommendation."""
@@ -50,18 +90,23 @@ class BreedRecommendation:
     score: float
     score_0_9: int = 0  # Normalized match score (0-9)
     # How breed matches EACH user need (same order as ExplanationData.user_needs)
-    # [{"need_name": str, "is_match": bool, "score_0_9": int, "components": {...}}, ...]
-    need_matches: list[dict] = None
+    need_matches: list[NeedMatch] = None
 
 
 @dataclass
 class ExplanationData:
     """Data prepared for LLM explanation generation."""
-    # User's clearest needs - the basis for explanation
-    user_needs: list[UserNeed]
+    # User's clearest needs - the basis for explanation, already split by kind
+    constraints: list[UserNeed]
+    preferences: list[UserNeed]
     # Top breeds with matches for each user need
     breeds: list[BreedRecommendation]
 
+    @property
+    def user_needs(self) -> list[UserNeed]:
+        """All explained needs: constraints first, then preferences."""
+        return self.constraints + self.preferences
+
 
 def normalize_to_0_9(value: float, min_val: float, max_val: float) -> int:
     """Normalize a value to 0-9 scale."""
@@ -77,42 +122,72 @@ def normalize_scores_0_9(scores: list[float]) -> list[int]:
         return []
     min_val = min(scores)
     max_val = max(scores)
-    return [normalize_to_0_9(s, min_val, max_val) for s in scores]
+    if max_val == min_val:
+        return [5] * len(scores)  # Neutral if no range
+    # Same arithmetic as normalize_to_0_9, inlined; values within the
+    # range always land in 0-9, so no clamping is needed
+    span = max_val - min_val
+    return [int((s - min_val) / span * 9 + 0.5) for s in scores]
 
 
-def load_breed_names() -> dict[str, str]:
-    """Load breed ID to Russian name mapping."""
-    breeds_file = DOMAIN_DIR / "content" / "breeds.json"
-    with open(breeds_file) as f:
-        data = json.load(f)
-    return {b["id"]: b["name_ru"] for b in data["breeds"]}
+def _read_json(path: Path) -> dict:
+    """Read a JSON file as bytes and parse it (UTF-8 is detected by json.loads)."""
+    with open(path, "rb") as f:
+        return json.loads(f.read())
 
 
-def load_needs_info() -> dict[str, dict]:
-    """Load need ID to info mapping (name, block, formula)."""
-    needs_file = DOMAIN_DIR / "content" / "user_needs.json"
-    with open(needs_file) as f:
-        data = json.load(f)
-    return {
-        n["id"]: {"name": n["name"], "block": n["block"], "formula": n["formula"]}
+@functools.lru_cache(maxsize=256)
+def extract_formula_variables(formula: str) -> tuple[str, ...]:
+    """Extract unique variable names from a formula string, in order of appearance."""
+    return tuple(dict.fromkeys(_FORMULA_VAR_RE.findall(formula)))
+
+
+def _load_breed_names_from_disk() -> MappingProxyType:
+    data = _read_json(DOMAIN_DIR / "content" / "breeds.json")
+    return MappingProxyType({b["id"]: b["name_ru"] for b in data["breeds"]})
+
+
+def _load_needs_info_from_disk() -> MappingProxyType:
+    data = _read_json(DOMAIN_DIR / "content" / "user_needs.json")
+    return MappingProxyType({
+        sys.intern(n["id"]): {
+            "name": n["name"],
+            "block": sys.intern(n["block"]),
+            "formula": n["formula"],
+            "formula_vars": extract_formula_variables(n["formula"]),
+        }
         for n in data["needs"]
-    }
+    })
+
 
+# Domain content is loaded once at import (None if the files are missing,
+# in which case the first load_* call reads them)
+try:
+    _BREED_NAMES: MappingProxyType | None = _load_breed_names_from_disk()
+    _NEEDS_INFO: MappingProxyType | None = _load_needs_info_from_disk()
+except FileNotFoundError:
+    _BREED_NAMES = None
+    _NEEDS_INFO = None
 
-def extract_formula_variables(formula: str) -> list[str]:
-    """Extract variable names from a formula string."""
-    import re
-    # Remove operators and parentheses, get variable names
-    # Variables are identifiers like: apartment_ok, barking, size_small
-    variables = re.findall(r'[a-z_][a-z0-9_]*', formula)
-    # Remove duplicates while preserving order
-    seen = set()
-    result = []
-    for v in variables:
-        if v not in seen:
-            seen.add(v)
-            result.append(v)
-    return result
+
+def load_breed_names() -> MappingProxyType:
+    """Get breed ID to Russian name mapping (shared, read-only)."""
+    global _BREED_NAMES
+    if _BREED_NAMES is None:
+        _BREED_NAMES = _load_breed_names_from_disk()
+    return _BREED_NAMES
+
+
+def load_needs_info() -> MappingProxyType:
+    """
+    Get need ID to info mapping (name, block, formula, formula_vars).
+
+    The mapping is shared between callers: do not mutate the nested info dicts.
+    """
+    global _NEEDS_INFO
+    if _NEEDS_INFO is None:
+        _NEEDS_INFO = _load_needs_info_from_disk()
+    return _NEEDS_INFO
 
 
 def load_profile(filepath: str | Path | None = None) -> UserProfile:
@@ -133,10 +208,51 @@ def load_profile(filepath: str | Path | None = None) -> UserProfile:
     if not filepath.exists():
         raise FileNotFoundError(f"Profile not found: {filepath}")
 
-    with open(filepath, encoding="utf-8") as f:
-        data = json.load(f)
+    return UserProfile.from_dict(_read_json(filepath))
 
-    return UserProfile.from_dict(data)
+
+# Component 0-9 scores depend only on matcher data: built once per matcher instance
+_BREED_COMPONENT_SCORES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_breed_component_scores(matcher: BreedMatcher) -> dict[str, dict[str, int]]:
+    """
+    Get breed_id -> {component_id: 0-9} for every breed context value.
+
+    Each component's T - F score is normalized across all breeds. Computed on
+    first use for a matcher and cached for its lifetime (shared, do not mutate).
+    """
+    breed_component_scores = _BREED_COMPONENT_SCORES.get(matcher)
+    if breed_component_scores is not None:
+        return breed_component_scores
+
+    # Raw T - F score per breed and component
+    raw_scores = {
+        breed_id: {comp_id: comp_val.t - comp_val.f for comp_id, comp_val in context.items()}
+        for breed_id, context in matcher.breed_contexts.items()
+    }
+
+    # Range of each component across ALL breeds for proper normalization
+    ranges: dict[str, tuple[float, float]] = {}
+    for scores in raw_scores.values():
+        for comp_id, score in scores.items():
+            lo, hi = ranges.get(comp_id, (score, score))
+            ranges[comp_id] = (min(lo, score), max(hi, score))
+
+    # (min, span) per component, so each value costs one sub/div/mul instead of
+    # a normalize_to_0_9 call (same arithmetic; span 0 -> neutral 5)
+    offsets = {comp_id: (lo, hi - lo) for comp_id, (lo, hi) in ranges.items()}
+
+    breed_component_scores = {}
+    for breed_id, scores in raw_scores.items():
+        comp_scores = {}
+        for comp_id, score in scores.items():
+            lo, span = offsets[comp_id]
+            comp_scores[comp_id] = int((score - lo) / span * 9 + 0.5) if span else 5
+        breed_component_scores[breed_id] = comp_scores
+
+    _BREED_COMPONENT_SCORES[matcher] = breed_component_scores
+    return breed_component_scores
 
 
 def collect_explanation_data(
@@ -164,67 +280,80 @@ def collect_explanation_data(
     needs_info = load_needs_info()
 
     user_needs_raw = profile.get_needs()
-    results = matcher.match_fast(user_needs_raw, top_k=top_k)
+    # ALL breed scores are needed for normalization: match once, then take the top_k
+    all_results = matcher.match_fast(user_needs_raw, top_k=None)
+    results = all_results[:top_k] if top_k else all_results
 
     if not results:
         raise ValueError("No matching breeds found")
 
-    # Analyze ALL user's answers (for proper normalization)
-    user_analysis = []
+    # Single pass over ALL user's answers: track the clarity range (for proper
+    # normalization) and keep clear-need candidates (high certainty, low
+    # contradiction) split into constraints and preferences.
+    # Candidate rows: (clarity, need_id, need_name, user_score)
+    constraint_candidates: list[tuple[float, str, str, float]] = []
+    preference_candidates: list[tuple[float, str, str, float]] = []
+    min_clarity = math.inf
+    max_clarity = -math.inf
+
     for need_id, user_val in user_needs_raw.items():
-        info = needs_info.get(need_id, {"name": need_id, "block": "unknown"})
         user_score = user_val.t - user_val.f
         certainty = abs(user_score)
         consistency = 1 - min(user_val.t, user_val.f)
+        clarity = certainty * consistency
+        min_clarity = min(min_clarity, clarity)
+        max_clarity = max(max_clarity, clarity)
 
-        user_analysis.append({
-            "need_id": need_id,
-            "need_name": info["name"],
-            "block": info["block"],
-            "is_constraint": info["block"] in CONSTRAINT_BLOCKS,
-            "user_wants": user_score > 0,
-            "user_score": user_score,
-            "certainty": certainty,
-            "consistency": consistency,
-            "clarity": certainty * consistency
-        })
-
-    # Normalize clarity scores across ALL user needs (not just filtered)
-    all_clarities = [n["clarity"] for n in user_analysis]
-    all_scores_0_9 = normalize_scores_0_9(all_clarities)
-
-    # Add normalized scores to analysis
-    for i, n in enumerate(user_analysis):
-        n["score_0_9"] = all_scores_0_9[i] if i < len(all_scores_0_9) else 5
-
-    # Filter to clear needs only (high certainty, low contradiction, high score)
-    clear_needs = [
-        n for n in user_analysis
-        if n["consistency"] > 0.7 and n["certainty"] > 0.5 and n["score_0_9"] >= min_need_score
-    ]
-    clear_needs.sort(key=lambda x: x["clarity"], reverse=True)
-
-    # Split into constraints and preferences, take top of each
-    clear_constraints = [n for n in clear_needs if n["is_constraint"]][:max_constraints]
-    clear_preferences = [n for n in clear_needs if not n["is_constraint"]][:max_preferences]
+        if not (consistency > 0.7 and certainty > 0.5):
+            continue
+
+        info = needs_info.get(need_id, {"name": need_id, "block": "unknown"})
+        row = (clarity, need_id, info["name"], user_score)
+        if info["block"] in CONSTRAINT_BLOCKS:
+            constraint_candidates.append(row)
+        else:
+            preference_candidates.append(row)
+
+    def top_clear_needs(candidates: list[tuple], limit: int, is_constraint: bool) -> list[dict]:
+        """Clearest candidates whose normalized clarity reaches min_need_score."""
+        scored = []
+        for clarity, need_id, need_name, user_score in candidates:
+            score_0_9 = normalize_to_0_9(clarity, min_clarity, max_clarity)
+            if score_0_9 >= min_need_score:
+                scored.append((clarity, need_id, need_name, user_score, score_0_9))
+        return [
+            {
+                "need_id": need_id,
+                "need_name": need_name,
+                "is_constraint": is_constraint,
+                "user_wants": user_score > 0,
+                "user_score": user_score,
+                "score_0_9": score_0_9,
+            }
+            for _, need_id, need_name, user_score, score_0_9
+            in heapq.nlargest(limit, scored, key=lambda r: r[0])
+        ]
+
+    clear_constraints = top_clear_needs(constraint_candidates, max_constraints, True)
+    clear_preferences = top_clear_needs(preference_candidates, max_preferences, False)
 
     # Combine into single list of needs to explain (constraints first, then preferences)
     needs_to_explain = clear_constraints + clear_preferences
 
     # Create UserNeed objects with normalized scores
-    user_needs = [
-        UserNeed(
+    def to_user_need(n: dict) -> UserNeed:
+        return UserNeed(
             need_id=n["need_id"],
             need_name=n["need_name"],
             user_wants=n["user_wants"],
             is_constraint=n["is_constraint"],
             score_0_9=n["score_0_9"]
         )
-        for n in needs_to_explain
-    ]
 
-    # Get ALL breed scores for proper normalization (not just top_k)
-    all_results = matcher.match_fast(user_needs_raw, top_k=None)
+    constraints = [to_user_need(n) for n in clear_constraints]
+    preferences = [to_user_need(n) for n in clear_preferences]
+
+    # Use ALL breed scores for proper normalization (not just top_k)
     all_breed_scores = [score for _, score in all_results]
 
     # Create mapping from breed_id to normalized score
@@ -234,97 +363,55 @@ def collect_explanation_data(
         for i, (breed_id, _) in enumerate(all_results)
     }
 
-    # Collect all component values across ALL breeds for proper normalization
-    # component_id -> list of all values across all breeds
-    all_component_values: dict[str, list[float]] = {}
-
-    for breed_id in matcher.breed_contexts:
-        breed_context = matcher.breed_contexts[breed_id]
-        for comp_id, comp_val in breed_context.items():
-            score = comp_val.t - comp_val.f
-            if comp_id not in all_component_values:
-                all_component_values[comp_id] = []
-            all_component_values[comp_id].append(score)
-
-    # Pre-compute normalized scores for each component
-    component_score_maps: dict[str, dict[float, int]] = {}
-    for comp_id, values in all_component_values.items():
-        if not values:
-            continue
-        min_val = min(values)
-        max_val = max(values)
-        # Create mapping from raw score to 0-9
-        component_score_maps[comp_id] = {
-            v: normalize_to_0_9(v, min_val, max_val)
-            for v in set(values)
-        }
+    # Component 0-9 scores, normalized across ALL breeds (static per matcher)
+    breed_component_scores = get_breed_component_scores(matcher)
+
+    # Formula variables depend only on the need (parsed once at load time)
+    need_vars = {
+        n["need_id"]: needs_info.get(n["need_id"], {}).get("formula_vars", ())
+        for n in needs_to_explain
+    }
 
     # First pass: collect ALL raw match scores across all breeds for normalization
     all_raw_matches = []
-    breed_match_data = {}  # breed_id -> list of match data
+    breeds = []
+
+    explain_need_ids = [n["need_id"] for n in needs_to_explain]
+    explain_user_scores = [n["user_score"] for n in needs_to_explain]
+    # Distinct variables across all explained formulas (shared ones resolved once per breed)
+    explain_vars = tuple(dict.fromkeys(v for need_id in explain_need_ids for v in need_vars[need_id]))
 
     for breed_id, total_score in results:
-        breed_row = matcher.eval_matrix[breed_id]
-        breed_context = matcher.breed_contexts.get(breed_id, {})
+        # Dense T - F scores (None for needs the matcher doesn't know)
+        breed_scores = matcher.get_scores(breed_id, explain_need_ids)
+        comp_scores = breed_component_scores.get(breed_id, _EMPTY_MAP)
 
-        need_match_data = []
-        for need_data in needs_to_explain:
+        # Normalized values of the formula components this breed has
+        breed_components = {var: comp_scores[var] for var in explain_vars if var in comp_scores}
+
+        need_matches = []
+        for need_data, user_score, breed_score in zip(needs_to_explain, explain_user_scores, breed_scores):
             need_id = need_data["need_id"]
-            info = needs_info.get(need_id, {})
-            formula = info.get("formula", "")
-            breed_val = breed_row.get(need_id)
 
-            if breed_val:
-                breed_score = breed_val.t - breed_val.f
-                match = need_data["user_score"] * breed_score
+            if breed_score is not None:
+                match = user_score * breed_score
                 is_match = match > 0
             else:
-                breed_score = 0.0
                 match = 0.0
                 is_match = False
 
-            # Extract component values with proper normalization across all breeds
-            components = {}
-            for var in extract_formula_variables(formula):
-                var_val = breed_context.get(var)
-                if var_val:
-                    score = var_val.t - var_val.f
-                    # Get normalized score from pre-computed map
-                    if var in component_score_maps and score in component_score_maps[var]:
-                        comp_0_9 = component_score_maps[var][score]
-                    else:
-                        # Fallback to fixed range normalization
-                        comp_0_9 = normalize_to_0_9(score, -1.0, 1.0)
-                    components[var] = comp_0_9
+            components = {
+                var: breed_components[var]
+                for var in need_vars[need_id]
+                if var in breed_components
+            }
 
             all_raw_matches.append(match)
-            need_match_data.append({
-                "need_name": need_data["need_name"],
-                "components": components,
-                "is_match": is_match,
-                "raw_match": match
-            })
-
-        breed_match_data[breed_id] = need_match_data
-
-    # Normalize ALL match scores together (across all breeds and needs)
-    all_match_scores_0_9 = normalize_scores_0_9(all_raw_matches)
-
-    # Second pass: build breed recommendations with normalized scores
-    breeds = []
-    match_idx = 0
-    for breed_id, total_score in results:
-        need_match_data = breed_match_data[breed_id]
-
-        need_matches = []
-        for data in need_match_data:
-            need_matches.append({
-                "need_name": data["need_name"],
-                "components": data["components"],
-                "is_match": data["is_match"],
-                "score_0_9": all_match_scores_0_9[match_idx] if match_idx < len(all_match_scores_0_9) else 5
-            })
-            match_idx += 1
+            need_matches.append(NeedMatch(
+                need_name=need_data["need_name"],
+                components=components,
+                is_match=is_match
+            ))
 
         breeds.append(BreedRecommendation(
             breed_id=breed_id,
@@ -334,12 +421,53 @@ def collect_explanation_data(
             need_matches=need_matches
         ))
 
+    # Second pass: normalize ALL match scores together (across all breeds and needs)
+    all_match_scores_0_9 = normalize_scores_0_9(all_raw_matches)
+    match_idx = 0
+    for breed in breeds:
+        for need_match in breed.need_matches:
+            need_match.score_0_9 = all_match_scores_0_9[match_idx]
+            match_idx += 1
+
     return ExplanationData(
-        user_needs=user_needs,
+        constraints=constraints,
+        preferences=preferences,
         breeds=breeds
     )
 
 
+# Static prompt text; only the needs/breeds sections and the language vary
+_PROMPT_TEMPLATE = '''You are a canine consultant. Explain to the user why these three breeds may suit them.
+
+DATA FORMAT:
+The number after the colon (0–9) is a service score.
+Use them for: comparisons, setting priorities, final conclusions.
+DO NOT mention the numbers themselves, DO NOT use words like "score", "points", "out of 9".
+
+User requirements:
+{user_needs_text}
+("important" = user wants this, "not required" = not a criterion for the user)
+
+Recommended breeds (✓ = matches, ✗ = does not match):
+{breeds_text}
+Instructions:
+- Format the response in HTML (use <p>, <strong>, <ul>, <li>, etc.)
+- Write in {language}, grammatically correct
+- Base your response ONLY on facts from the context above — do not invent information
+- Use scores to set priorities: high scores — emphasize, low scores — mention as drawbacks
+- Introduction: 2-3 sentences — user's key requirements (based on high need scores)
+- For each breed: 3-5 sentences, prioritizing by characteristic scores
+- Do NOT mention characteristics marked "not required"
+- Tone: calm, informative, without enthusiastic evaluations
+- At the end: 2-3 sentences — what to consider when choosing (no heading)'''
+
+
+@functools.lru_cache(maxsize=32)
+def _breed_block_format(n_matches: int) -> str:
+    """Format string for a breed block with n_matches need lines (cached per shape)."""
+    return "\n{}. {}:{}\n" + "  [{}] {}:{}{}\n" * n_matches
+
+
 def build_prompt(data: ExplanationData, language: str = "Russian") -> str:
     """
     Build LLM prompt for explanation generation.
@@ -352,62 +480,177 @@ def build_prompt(data: ExplanationData, language: str = "Russian") -> str:
         Prompt string for LLM
     """
     # Format user needs with type marker and scores
-    constraints = [n for n in data.user_needs if n.is_constraint]
-    preferences = [n for n in data.user_needs if not n.is_constraint]
-
-    user_needs_text = ""
-    if constraints:
-        user_needs_text += "Constraints (living conditions):\n"
-        user_needs_text += "\n".join(
+    parts = []
+    if data.constraints:
+        parts.append("Constraints (living conditions):\n")
+        parts.append("\n".join(
             f"  - {n.need_name}:{n.score_0_9} {'important' if n.user_wants else 'not required'}"
-            for n in constraints
-        )
-        user_needs_text += "\n"
-    if preferences:
-        user_needs_text += "Preferences (character, behavior):\n"
-        user_needs_text += "\n".join(
+            for n in data.constraints
+        ))
+        parts.append("\n")
+    if data.preferences:
+        parts.append("Preferences (character, behavior):\n")
+        parts.append("\n".join(
             f"  - {n.need_name}:{n.score_0_9} {'important' if n.user_wants else 'not required'}"
-            for n in preferences
-        )
+            for n in data.preferences
+        ))
+    user_needs_text = "".join(parts)
 
     # Format each breed with matches for ALL user needs
-    breeds_text = ""
+    blocks = []
     for i, breed in enumerate(data.breeds, 1):
-        breeds_text += f"\n{i}. {breed.breed_name}:{breed.score_0_9}\n"
+        args = [i, breed.breed_name, breed.score_0_9]
         for match in breed.need_matches:
-            status = "✓" if match["is_match"] else "✗"
+            status = "✓" if match.is_match else "✗"
             # Show component values with scores
-            components_str = ", ".join(f"{k}:{v}" for k, v in match["components"].items())
-            breeds_text += f"  [{status}] {match['need_name']}:{match['score_0_9']}"
-            if components_str:
-                breeds_text += f" ({components_str})"
-            breeds_text += "\n"
+            components_str = ""
+            if match.components:
+                components_str = " (" + ", ".join(f"{k}:{v}" for k, v in match.components.items()) + ")"
+            args += (status, match.need_name, match.score_0_9, components_str)
+        blocks.append(_breed_block_format(len(breed.need_matches)).format(*args))
+    breeds_text = "".join(blocks)
+
+    return _PROMPT_TEMPLATE.format(
+        user_needs_text=user_needs_text,
+        breeds_text=breeds_text,
+        language=language
+    )
 
-    prompt = f'''You are a canine consultant. Explain to the user why these three breeds may suit them.
 
-DATA FORMAT:
-The number after the colon (0–9) is a service score.
-Use them for: comparisons, setting priorities, final conclusions.
-DO NOT mention the numbers themselves, DO NOT use words like "score", "points", "out of 9".
+def build_explanation_prompt(profile: UserProfile, matcher: BreedMatcher) -> str:
+    """Collect explanation data and build the LLM prompt in the configured language."""
+    # Load config
+    config = load_config()
+    explanation_config = config.get("explanation", {})
+    language = explanation_config.get("language", "Russian")
 
-User requirements:
-{user_needs_text}
-("important" = user wants this, "not required" = not a criterion for the user)
+    # Collect data
+    data = collect_explanation_data(profile, matcher)
 
-Recommended breeds (✓ = matches, ✗ = does not match):
-{breeds_text}
-Instructions:
-- Format the response in HTML (use <p>, <strong>, <ul>, <li>, etc.)
-- Write in {language}, grammatically correct
-- Base your response ONLY on facts from the context above — do not invent information
-- Use scores to set priorities: high scores — emphasize, low scores — mention as drawbacks
-- Introduction: 2-3 sentences — user's key requirements (based on high need scores)
-- For each breed: 3-5 sentences, prioritizing by characteristic scores
-- Do NOT mention characteristics marked "not required"
-- Tone: calm, informative, without enthusiastic evaluations
-- At the end: 2-3 sentences — what to consider when choosing (no heading)'''
+    # Build prompt with language from config
+    return build_prompt(data, language=language)
+
+
+def get_client(api_key: str | None = None) -> "OpenAI":
+    """Get or create the shared Nebius API client (recreated if the key changes)."""
+    from openai import OpenAI
+
+    global _client
+    api_key = api_key or os.environ.get("NEBIUS_API_KEY")
+    if _client is None or _client.api_key != api_key:
+        _client = OpenAI(base_url=NEBIUS_BASE_URL, api_key=api_key)
+    return _client
+
+
+def get_async_client(api_key: str | None = None) -> "AsyncOpenAI":
+    """Get or create the shared async Nebius API client (recreated if the key changes)."""
+    from openai import AsyncOpenAI
+
+    global _aclient
+    api_key = api_key or os.environ.get("NEBIUS_API_KEY")
+    if _aclient is None or _aclient.api_key != api_key:
+        _aclient = AsyncOpenAI(base_url=NEBIUS_BASE_URL, api_key=api_key)
+    return _aclient
+
+
+def _completion_kwargs(prompt: str) -> dict:
+    """Chat completion request parameters for an explanation prompt."""
+    return {
+        "model": EXPLANATION_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7,
+        "max_tokens": 4000,
+    }
+
+
+def _cache_path(request: dict) -> Path | None:
+    """Cache file for a completion request, or None if caching is disabled."""
+    if os.environ.get("EXPLAIN_CACHE") != "1":
+        return None
+    # Key covers prompt, model, temperature and max_tokens
+    payload = json.dumps(request, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    key = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    return CACHE_DIR / f"{key}.txt"
+
+
+def _cache_read(path: Path | None) -> str | None:
+    """Return cached response text, if present."""
+    if path is None or not path.exists():
+        return None
+    return path.read_text(encoding="utf-8")
+
+
+def _cache_write(path: Path | None, text: str | None) -> None:
+    """Store response text atomically (write to temp file, then rename)."""
+    if path is None or not text:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _response_text(response) -> str | None:
+    """Extract explanation text from a chat completion response."""
+    message = response.choices[0].message
+    # gpt-oss-120b is a reasoning model: content may be None, use reasoning_content as fallback
+    return message.content or getattr(message, 'reasoning_content', None)
+
+
+def generate_explanation_stream(
+    profile: UserProfile,
+    matcher: BreedMatcher,
+    api_key: str | None = None
+) -> Iterator[str]:
+    """
+    Generate explanation, yielding text chunks as the LLM produces them.
+
+    Args:
+        profile: User profile with answered needs
+        matcher: Breed matcher instance
+        api_key: Nebius API key (defaults to NEBIUS_API_KEY env var)
 
-    return prompt
+    Set EXPLAIN_CACHE=1 to reuse responses for identical requests
+    (cached under domains/dog_breeds/cache/); a cache hit is yielded as one chunk.
+
+    Yields:
+        Explanation text chunks
+    """
+    prompt = build_explanation_prompt(profile, matcher)
+    request = _completion_kwargs(prompt)
+
+    cache_path = _cache_path(request)
+    cached = _cache_read(cache_path)
+    if cached is not None:
+        yield cached
+        return
+
+    # Call LLM
+    stream = get_client(api_key).chat.completions.create(**request, stream=True)
+
+    content_parts = []
+    reasoning_parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            yield delta.content
+        else:
+            reasoning = getattr(delta, "reasoning_content", None)
+            if reasoning:
+                reasoning_parts.append(reasoning)
+
+    if content_parts:
+        text = "".join(content_parts)
+    else:
+        # gpt-oss-120b is a reasoning model: content may be empty, use reasoning_content as fallback
+        text = "".join(reasoning_parts)
+        if text:
+            yield text
+
+    _cache_write(cache_path, text)
 
 
 def generate_explanation(
@@ -418,6 +661,8 @@ def generate_explanation(
     """
     Generate human-friendly explanation for breed recommendation.
 
+    Complete-text wrapper around generate_explanation_stream().
+
     Args:
         profile: User profile with answered needs
         matcher: Breed matcher instance
@@ -426,38 +671,119 @@ def generate_explanation(
     Returns:
         Generated explanation text
     """
-    # Load config
-    config = load_config()
-    explanation_config = config.get("explanation", {})
-    language = explanation_config.get("language", "Russian")
+    return "".join(generate_explanation_stream(profile, matcher, api_key=api_key))
 
-    # Collect data
-    data = collect_explanation_data(profile, matcher)
 
-    # Build prompt with language from config
-    prompt = build_prompt(data, language=language)
+async def agenerate_explanation(
+    profile: UserProfile,
+    matcher: BreedMatcher,
+    api_key: str | None = None
+) -> str:
+    """Async version of generate_explanation (non-blocking LLM call)."""
+    prompt = build_explanation_prompt(profile, matcher)
+    request = _completion_kwargs(prompt)
 
-    # Call LLM
-    client = OpenAI(
-        base_url="https://api.tokenfactory.nebius.com/v1/",
-        api_key=api_key or os.environ.get("NEBIUS_API_KEY")
+    cache_path = _cache_path(request)
+    cached = _cache_read(cache_path)
+    if cached is not None:
+        return cached
+
+    response = await get_async_client(api_key).chat.completions.create(**request)
+    text = _response_text(response)
+    _cache_write(cache_path, text)
+    return text
+
+
+async def agenerate_explanations(
+    profiles: list[UserProfile],
+    matcher: BreedMatcher,
+    api_key: str | None = None
+) -> list[str]:
+    """
+    Generate explanations for several profiles concurrently.
+
+    Returns:
+        Explanation texts in the same order as profiles
+    """
+    return await asyncio.gather(
+        *(agenerate_explanation(p, matcher, api_key=api_key) for p in profiles)
     )
 
-    response = client.chat.completions.create(
-        model="openai/gpt-oss-120b",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-        max_tokens=4000
+
+def generate_explanations_batch(
+    profiles: list[UserProfile],
+    matcher: BreedMatcher,
+    api_key: str | None = None,
+    poll_interval: float = 30.0
+) -> list[str | None]:
+    """
+    Generate explanations for many profiles via the Batch API.
+
+    Requests are uploaded as a single JSONL file and processed asynchronously
+    on the provider side (cheaper than per-request calls, but may take up to
+    the 24h completion window). A single profile uses the regular
+    synchronous path.
+
+    Args:
+        profiles: User profiles to explain
+        matcher: Breed matcher instance
+        api_key: Nebius API key (defaults to NEBIUS_API_KEY env var)
+        poll_interval: Seconds between batch status checks
+
+    Returns:
+        Explanation texts in the same order as profiles (None for failed requests)
+    """
+    if len(profiles) <= 1:
+        return [generate_explanation(p, matcher, api_key=api_key) for p in profiles]
+
+    client = get_client(api_key)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as f:
+        for i, profile in enumerate(profiles):
+            request = {
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": _completion_kwargs(build_explanation_prompt(profile, matcher)),
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        requests_path = Path(f.name)
+
+    try:
+        with open(requests_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+    finally:
+        requests_path.unlink(missing_ok=True)
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
     )
 
-    message = response.choices[0].message
-    # gpt-oss-120b is a reasoning model: content may be None, use reasoning_content as fallback
-    return message.content or getattr(message, 'reasoning_content', None)
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} finished with status: {batch.status}")
+
+    texts: list[str | None] = [None] * len(profiles)
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        message = response["body"]["choices"][0]["message"]
+        texts[int(result["custom_id"])] = message.get("content") or message.get("reasoning_content")
+
+    return texts
 
 
 # For testing
 if __name__ == "__main__":
-    import sys
     from dotenv import load_dotenv
     load_dotenv(str(PROJECT_ROOT / ".env"))
 
@@ -485,16 +811,14 @@ if __name__ == "__main__":
     data = collect_explanation_data(profile, matcher)
 
     print("User needs to explain:")
-    constraints = [n for n in data.user_needs if n.is_constraint]
-    preferences = [n for n in data.user_needs if not n.is_constraint]
-    if constraints:
+    if data.constraints:
         print("  Constraints:")
-        for need in constraints:
+        for need in data.constraints:
             direction = "wants" if need.user_wants else "not needed"
             print(f"    - {need.need_name}: {direction}")
-    if preferences:
+    if data.preferences:
         print("  Preferences:")
-        for need in preferences:
+        for need in data.preferences:
             direction = "wants" if need.user_wants else "not needed"
             print(f"    - {need.need_name}: {direction}")
     print()
@@ -503,9 +827,9 @@ if __name__ == "__main__":
     for breed in data.breeds:
         print(f"\n  {breed.breed_name} (score={breed.score})")
         for match in breed.need_matches:
-            status = "✓" if match["is_match"] else "✗"
-            components = ", ".join(f"{k}={v}" for k, v in match["components"].items())
-            line = f"    [{status}] {match['need_name']}"
+            status = "✓" if match.is_match else "✗"
+            components = ", ".join(f"{k}={v}" for k, v in match.components.items())
+            line = f"    [{status}] {match.need_name}"
             if components:
                 line += f" ({components})"
             print(line)
@@ -524,7 +848,9 @@ if __name__ == "__main__":
     # Generate explanation (if API key available)
     if os.environ.get("NEBIUS_API_KEY"):
         print("=== EXPLANATION ===")
-        explanation = generate_explanation(profile, matcher)
-        print(explanation)
+        # Print chunks as they arrive instead of waiting for the full text
+        for chunk in generate_explanation_stream(profile, matcher):
+            print(chunk, end="", flush=True)
+        print()
     else:
         print("Set NEBIUS_API_KEY to generate explanation")
@@ -5,7 +5,11 @@ Calculates match scores between user needs and object characteristics
 using 4-valued fuzzy logic (fuzzy4).
 """
 
+import ast
 import json
+from collections import OrderedDict
+from collections.abc import Callable
+from operator import itemgetter
 from pathlib import Path
 from dataclasses import dataclass
 from typing import Any
@@ -13,6 +17,71 @@ from typing import Any
 from fuzzy4 import FuzzyBool
 
 
+# Flat (t, f) tuple versions of the fuzzy4 operators used in need formulas.
+# Same product t-norm / probabilistic s-norm arithmetic and clamping as FuzzyBool,
+# so results are identical, without building a FuzzyBool per operation.
+
+def _clamp_tf(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+def _not_tf(a: tuple[float, float]) -> tuple[float, float]:
+    return a[1], a[0]
+
+
+def _and_tf(a: tuple[float, float], b: tuple[float, float]) -> tuple[float, float]:
+    return a[0] * b[0], _clamp_tf(a[1] + b[1] - a[1] * b[1])
+
+
+def _or_tf(a: tuple[float, float], b: tuple[float, float]) -> tuple[float, float]:
+    return _clamp_tf(a[0] + b[0] - a[0] * b[0]), a[1] * b[1]
+
+
+_FLAT_GLOBALS = {"__builtins__": {}, "_not_tf": _not_tf, "_and_tf": _and_tf, "_or_tf": _or_tf}
+
+
+def _flat_source(node: ast.AST) -> str | None:
+    """Rewrite a formula AST into calls of the flat operators (None if unsupported)."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        operand = _flat_source(node.operand)
+        return None if operand is None else f"_not_tf({operand})"
+    if isinstance(node, ast.BinOp):
+        left, right = _flat_source(node.left), _flat_source(node.right)
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, ast.BitAnd):
+            return f"_and_tf({left}, {right})"
+        if isinstance(node.op, ast.BitOr):
+            return f"_or_tf({left}, {right})"
+        if isinstance(node.op, ast.RShift):
+            # x >> y == ~x | y
+            return f"_or_tf(_not_tf({left}), {right})"
+    return None
+
+
+def _compile_flat_formula(
+    formula: str,
+    name: str = "<formula>"
+) -> tuple[tuple[str, ...], Callable[..., tuple[float, float]]] | None:
+    """
+    Compile a need formula to a function over (t, f) tuples instead of FuzzyBool.
+
+    Returns (var_names, fn): the referenced variables, in order of first use, are
+    fn's positional parameters, so a call needs no locals dict.
+    Supports variables, ~, &, | and >>; returns None for anything else
+    (callers fall back to evaluating the formula with FuzzyBool).
+    """
+    tree = ast.parse(formula, mode="eval")
+    source = _flat_source(tree.body)
+    if source is None:
+        return None
+    var_names = tuple(dict.fromkeys(node.id for node in ast.walk(tree) if isinstance(node, ast.Name)))
+    code = compile(f"lambda {', '.join(var_names)}: {source}", name, "eval")
+    return var_names, eval(code, _FLAT_GLOBALS)
+
+
 @dataclass
 class MatchResult:
     """Result of matching an object against user needs."""
@@ -32,40 +101,46 @@ class Matcher:
     # Default domain path (relative to this file)
     DEFAULT_DOMAIN = Path(__file__).parent.parent.parent.parent / "domains" / "dog_breeds"
 
+    # Number of recent match_fast rankings kept per matcher
+    MATCH_CACHE_SIZE = 128
+
     def __init__(self, domain_dir: Path | str | None = None):
         if domain_dir is None:
             domain_dir = self.DEFAULT_DOMAIN
         self.domain_dir = Path(domain_dir)
 
         # Load config
-        with open(self.domain_dir / "config.json", "r", encoding="utf-8") as f:
-            self.config = json.load(f)
+        self.config = json.loads((self.domain_dir / "config.json").read_bytes())
 
         # Pre-load all data
         self._load_needs()
         self._load_breeds()
         self._precompute_matrix()
 
+        # (user needs, breed_ids, equal_weights) -> full ranking, most recent last
+        self._match_cache: OrderedDict[tuple, list[tuple[str, float]]] = OrderedDict()
+
     def _load_needs(self):
         """Load and pre-compile user needs formulas."""
         needs_file = self.domain_dir / self.config["paths"]["content"] / "user_needs.json"
-        with open(needs_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(needs_file.read_bytes())
 
         self.needs: dict[str, dict] = {}
         self.compiled_formulas: dict[str, Any] = {}  # Pre-compiled code objects
+        # Same, as (var_names, fn) over (t, f) tuples (None = unsupported)
+        self.flat_formulas: dict[str, tuple[tuple[str, ...], Callable] | None] = {}
 
         for need in data["needs"]:
             need_id = need["id"]
             self.needs[need_id] = need
             # Pre-compile formula for fast eval
             self.compiled_formulas[need_id] = compile(need["formula"], f"<{need_id}>", "eval")
+            self.flat_formulas[need_id] = _compile_flat_formula(need["formula"], f"<{need_id}>")
 
     def _load_features(self) -> list[str]:
         """Load list of all feature IDs from object_features.json."""
         features_file = self.domain_dir / self.config["paths"]["content"] / "object_features.json"
-        with open(features_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json.loads(features_file.read_bytes())
 
         feature_ids = []
         for feat in data.get("features", []):
@@ -88,20 +163,21 @@ class Matcher:
         # Get all known feature IDs for default UNKNOWN values
         all_feature_ids = self._load_features()
         UNKNOWN = FuzzyBool(0, 0)
+        # Shared all-UNKNOWN context, copied per breed (a C-level dict copy)
+        base_context = dict.fromkeys(all_feature_ids, UNKNOWN)
 
         self.breeds: dict[str, dict] = {}
         self.breed_contexts: dict[str, dict[str, FuzzyBool]] = {}
 
         for fpath in fuzzy_dir.glob("*.json"):
-            with open(fpath, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = json.loads(fpath.read_bytes())
 
             breed_id = data["breed_id"]
             self.breeds[breed_id] = data
 
             # Build evaluation context (all variables as FuzzyBool)
             # Start with UNKNOWN for all features
-            context = {feat_id: UNKNOWN for feat_id in all_feature_ids}
+            context = base_context.copy()
 
             # Add features from data (overwrites UNKNOWN)
             for feat_id, feat_data in data.get("features", {}).items():
@@ -115,13 +191,57 @@ class Matcher:
             self.breed_contexts[breed_id] = context
 
     def _precompute_matrix(self):
-        """Pre-compute all (breed × need) evaluations."""
-        self.eval_matrix: dict[str, dict[str, FuzzyBool]] = {}
+        """
+        Pre-compute all (breed × need) evaluations.
 
-        for breed_id, context in self.breed_contexts.items():
-            self.eval_matrix[breed_id] = {}
-            for need_id, code in self.compiled_formulas.items():
-                self.eval_matrix[breed_id][need_id] = eval(code, {"__builtins__": {}}, context)
+        Stores them as flat T and F matrices, t_rows/f_rows[breed_index[breed_id]][need_index[need_id]],
+        plus the dense T - F score matrix score_rows with the same layout,
+        and the per-need mean |T - F| used for split quality.
+        """
+        self.breed_index: dict[str, int] = {}
+        self.need_index: dict[str, int] = {
+            need_id: j for j, need_id in enumerate(self.compiled_formulas)
+        }
+        self.t_rows: list[list[float]] = []
+        self.f_rows: list[list[float]] = []
+        self.score_rows: list[list[float]] = []
+
+        # Evaluate each formula over all breeds in one pass (one sandbox for all evals),
+        # as flat (t, f) tuples where the formula allows it
+        sandbox = {"__builtins__": {}}
+        contexts = list(self.breed_contexts.values())
+        flat_contexts = [
+            {feat_id: (val.t, val.f) for feat_id, val in context.items()} for context in contexts
+        ]
+        columns = []
+        for need_id, code in self.compiled_formulas.items():
+            flat = self.flat_formulas[need_id]
+            if flat is not None:
+                # Positional arguments straight from each breed's context
+                var_names, fn = flat
+                get_args = itemgetter(*var_names)
+                if len(var_names) == 1:
+                    columns.append([fn(get_args(context)) for context in flat_contexts])
+                else:
+                    columns.append([fn(*get_args(context)) for context in flat_contexts])
+            else:
+                columns.append([
+                    (val.t, val.f) for val in (eval(code, sandbox, context) for context in contexts)
+                ])
+
+        for i, breed_id in enumerate(self.breed_contexts):
+            t_row = [column[i][0] for column in columns]
+            f_row = [column[i][1] for column in columns]
+            self.breed_index[breed_id] = i
+            self.t_rows.append(t_row)
+            self.f_rows.append(f_row)
+            self.score_rows.append([t - f for t, f in zip(t_row, f_row)])
+
+        # Mean |T - F| of each need over all breeds (numerator of the split quality)
+        n_breeds = len(self.score_rows)
+        self.mean_abs_scores: list[float] = [
+            sum(abs(v) for v in column) / n_breeds for column in zip(*self.score_rows)
+        ] if n_breeds else [0.0] * len(self.need_index)
 
     def evaluate_need(
         self,
@@ -131,7 +251,19 @@ class Matcher:
         """
         Get pre-computed need evaluation for a breed. O(1) lookup.
         """
-        return self.eval_matrix[breed_id][need_id]
+        i = self.breed_index[breed_id]
+        j = self.need_index[need_id]
+        return FuzzyBool(self.t_rows[i][j], self.f_rows[i][j])
+
+    def get_scores(self, breed_id: str, need_ids: list[str]) -> list[float | None]:
+        """
+        Get pre-computed T - F scores of a breed for the given needs.
+
+        Unknown need IDs yield None.
+        """
+        row = self.score_rows[self.breed_index[breed_id]]
+        need_index = self.need_index
+        return [row[need_index[nid]] if nid in need_index else None for nid in need_ids]
 
     def compute_match(
         self,
@@ -151,7 +283,8 @@ class Matcher:
         self,
         breed_id: str,
         user_needs: dict[str, FuzzyBool],
-        equal_weights: bool = False
+        equal_weights: bool = False,
+        include_details: bool = True
     ) -> MatchResult:
         """
         Match a single breed against user needs.
@@ -161,13 +294,18 @@ class Matcher:
             user_needs: Dict of need_id -> FuzzyBool (user's desired value)
                        Only include needs that are set (not independent)
             equal_weights: If True, all needs have weight=1 (ignore user confidence)
+            include_details: If False, skip building per-need details (score only)
 
         Returns:
             MatchResult with overall score and per-need details
         """
         if not user_needs:
             # No needs specified - neutral match
-            return MatchResult(breed_id=breed_id, score=0.0, details={})
+            return MatchResult(object_id=breed_id, score=0.0, details={})
+
+        if not include_details:
+            score = self._compute_scores_array(user_needs, [breed_id], equal_weights)[0]
+            return MatchResult(object_id=breed_id, score=round(score, 3), details={})
 
         details = {}
         match_scores = []
@@ -199,7 +337,7 @@ class Matcher:
             score = 0.0
 
         return MatchResult(
-            breed_id=breed_id,
+            object_id=breed_id,
             score=round(score, 3),
             details=details
         )
@@ -208,7 +346,8 @@ class Matcher:
         self,
         user_needs: dict[str, FuzzyBool],
         top_k: int | None = None,
-        equal_weights: bool = False
+        equal_weights: bool = False,
+        include_details: bool = True
     ) -> list[MatchResult]:
         """
         Match all breeds against user needs.
@@ -217,6 +356,7 @@ class Matcher:
             user_needs: Dict of need_id -> FuzzyBool
             top_k: If set, return only top K results
             equal_weights: If True, all needs have weight=1
+            include_details: If False, return scores only (empty details)
 
         Returns:
             List of MatchResult sorted by score descending
@@ -224,7 +364,9 @@ class Matcher:
         results = []
 
         for breed_id in self.breeds:
-            result = self.match_breed(breed_id, user_needs, equal_weights=equal_weights)
+            result = self.match_breed(
+                breed_id, user_needs, equal_weights=equal_weights, include_details=include_details
+            )
             results.append(result)
 
         # Sort by score descending
@@ -260,50 +402,30 @@ class Matcher:
         if not user_needs:
             return [(bid, 0.0) for bid in breed_ids]
 
-        need_ids = list(user_needs.keys())
-        user_values = [user_needs[nid] for nid in need_ids]
-
-        scores = []
-
-        for breed_id in breed_ids:
-            breed_row = self.eval_matrix[breed_id]
-            match_scores = []
-
-            for i, need_id in enumerate(need_ids):
-                breed_val = breed_row[need_id]
-                user_val = user_values[i]
-
-                # T-F score comparison
-                user_score = user_val.t - user_val.f
-                breed_score = breed_val.t - breed_val.f
-
-                # Match via multiplication:
-                # user=+1, breed=+1 → +1 (want and have = good)
-                # user=+1, breed=-1 → -1 (want but don't have = bad)
-                # user=-1, breed=+1 → -1 (don't want but have = bad)
-                # user=-1, breed=-1 → +1 (don't want and don't have = good)
-                match = user_score * breed_score
-
-                # Weight by user's confidence (how strongly they care)
-                weight = 1.0 if equal_weights else abs(user_score)
-                match_scores.append((match, weight))
-
-            # Weighted average of match scores
-            total_weight = sum(w for _, w in match_scores)
-            if total_weight > 0:
-                score = sum(m * w for m, w in match_scores) / total_weight
-            else:
-                score = 0.0
-
-            scores.append((breed_id, round(score, 3)))
-
-        # Sort by score descending
-        scores.sort(key=lambda x: x[1], reverse=True)
-
-        if top_k:
-            scores = scores[:top_k]
+        # Repeated queries (e.g. redrawing the same screen) reuse the ranking;
+        # the key is exact, including need order, so results are unchanged
+        key = (
+            tuple((nid, val.t, val.f) for nid, val in user_needs.items()),
+            tuple(breed_ids),
+            equal_weights,
+        )
+        cache = self._match_cache
+        scores = cache.get(key)
+        if scores is None:
+            scores = self._compute_scores_array(user_needs, breed_ids, equal_weights)
+            scores = [(bid, round(score, 3)) for bid, score in zip(breed_ids, scores)]
+
+            # Sort by score descending
+            scores.sort(key=lambda x: x[1], reverse=True)
+
+            cache[key] = scores
+            if len(cache) > self.MATCH_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
 
-        return scores
+        # Callers get their own list; the cached ranking is never handed out
+        return scores[:top_k] if top_k else scores[:]
 
     # Alias for backwards compatibility
     match_all_fast = match_fast
@@ -341,28 +463,48 @@ class Matcher:
         best_need = None
         best_split = -1.0
 
-        breed_ids = list(self.breeds.keys())
-        n_breeds = len(breed_ids)
-
-        for need_id in unanswered:
-            # Simulate answer = TRUE
-            needs_true = {**current_needs, need_id: FuzzyBool(1, 0)}
-            scores_true = self._compute_scores_array(needs_true, breed_ids, equal_weights)
-
-            # Simulate answer = FALSE
-            needs_false = {**current_needs, need_id: FuzzyBool(0, 1)}
-            scores_false = self._compute_scores_array(needs_false, breed_ids, equal_weights)
-
-            # Split quality = mean absolute difference
-            # Higher = answer matters more = better question
-            split_score = sum(abs(scores_true[i] - scores_false[i]) for i in range(n_breeds)) / n_breeds
+        # Split quality = mean absolute difference between TRUE and FALSE answers
+        # Higher = answer matters more = better question
+        splits = self._split_scores(current_needs, unanswered, equal_weights)
 
+        for need_id, split_score in zip(unanswered, splits):
             if split_score > best_split:
                 best_split = split_score
                 best_need = need_id
 
         return best_need, round(best_split, 4)
 
+    def _split_scores(
+        self,
+        current_needs: dict[str, FuzzyBool],
+        need_ids: list[str],
+        equal_weights: bool = False
+    ) -> list[float]:
+        """
+        Split quality of each need: mean |score(TRUE) - score(FALSE)| over all breeds.
+
+        Answering a need TRUE/FALSE adds +b/-b (weight 1) to every breed's weighted
+        sum, so per breed the difference is 2 * |b| / (W + 1), where b is the breed's
+        T - F score for the need and W the weight of the other current needs.
+        """
+        weights = {
+            nid: 1.0 if equal_weights else abs(val.t - val.f)
+            for nid, val in current_needs.items()
+        }
+        total_weight = sum(weights.values())
+        mean_abs_scores = self.mean_abs_scores
+        need_index = self.need_index
+
+        splits = []
+        for need_id in need_ids:
+            if need_id in weights:
+                # Re-answering replaces the current value instead of adding a need
+                other_weight = sum(w for nid, w in weights.items() if nid != need_id)
+            else:
+                other_weight = total_weight
+            splits.append(2 * mean_abs_scores[need_index[need_id]] / (other_weight + 1))
+        return splits
+
     def _compute_scores_array(
         self,
         user_needs: dict[str, FuzzyBool],
@@ -373,40 +515,46 @@ class Matcher:
         Compute scores for breeds as a list (for batch comparison).
 
         Uses fuzzy AND to combine matches. Score = T - F.
-        Internal method optimized for split quality calculation.
+        Internal scoring kernel shared by match_fast; scores are not rounded.
         """
         if not user_needs:
             return [0.0] * len(breed_ids)
 
-        need_ids = list(user_needs.keys())
-        user_values = [(user_needs[nid].t, user_needs[nid].f) for nid in need_ids]
-
-        scores = []
-        for breed_id in breed_ids:
-            breed_row = self.eval_matrix[breed_id]
-            match_scores = []
-
-            for i, need_id in enumerate(need_ids):
-                breed_val = breed_row[need_id]
-                user_t, user_f = user_values[i]
-
-                user_score = user_t - user_f
-                breed_score = breed_val.t - breed_val.f
-
-                # Match via multiplication
-                match = user_score * breed_score
-                weight = 1.0 if equal_weights else abs(user_score)
-                match_scores.append((match, weight))
-
-            total_weight = sum(w for _, w in match_scores)
-            if total_weight > 0:
-                score = sum(m * w for m, w in match_scores) / total_weight
-            else:
-                score = 0.0
-
-            scores.append(score)
+        # T-F user scores and their matrix columns, resolved once for all breeds
+        need_index = self.need_index
+        user_scores = [val.t - val.f for val in user_needs.values()]
+        columns = [need_index[nid] for nid in user_needs]
+        score_rows = self.score_rows
+        breed_index = self.breed_index
+
+        # Match via multiplication:
+        # user=+1, breed=+1 → +1 (want and have = good)
+        # user=+1, breed=-1 → -1 (want but don't have = bad)
+        # user=-1, breed=+1 → -1 (don't want but have = bad)
+        # user=-1, breed=-1 → +1 (don't want and don't have = good)
+        if equal_weights:
+            # Every weight is 1: plain mean of the matches (x * 1.0 == x, same result)
+            terms = list(zip(columns, user_scores))
+            n_needs = len(terms)
+            return [
+                sum(u * row[j] for j, u in terms) / n_needs
+                for row in [score_rows[breed_index[bid]] for bid in breed_ids]
+            ]
+
+        # Weight by user's confidence (how strongly they care)
+        weights = [abs(u) for u in user_scores]
+        terms = list(zip(columns, user_scores, weights))
+
+        # Weights do not depend on the breed
+        total_weight = sum(weights)
+        if not total_weight > 0:
+            return [0.0] * len(breed_ids)
 
-        return scores
+        # Weighted average of match scores over one dense row per breed
+        return [
+            sum(u * row[j] * w for j, u, w in terms) / total_weight
+            for row in [score_rows[breed_index[bid]] for bid in breed_ids]
+        ]
 
     def get_question_rankings(
         self,
@@ -426,20 +574,8 @@ class Matcher:
         all_need_ids = list(self.needs.keys())
         unanswered = [nid for nid in all_need_ids if nid not in answered_needs]
 
-        breed_ids = list(self.breeds.keys())
-        n_breeds = len(breed_ids)
-
-        rankings = []
-
-        for need_id in unanswered:
-            needs_true = {**current_needs, need_id: FuzzyBool(1, 0)}
-            scores_true = self._compute_scores_array(needs_true, breed_ids, equal_weights)
-
-            needs_false = {**current_needs, need_id: FuzzyBool(0, 1)}
-            scores_false = self._compute_scores_array(needs_false, breed_ids, equal_weights)
-
-            split_score = sum(abs(scores_true[i] - scores_false[i]) for i in range(n_breeds)) / n_breeds
-            rankings.append((need_id, round(split_score, 4)))
+        splits = self._split_scores(current_needs, unanswered, equal_weights)
+        rankings = [(need_id, round(split_score, 4)) for need_id, split_score in zip(unanswered, splits)]
 
         rankings.sort(key=lambda x: x[1], reverse=True)
 
@@ -540,7 +676,7 @@ if __name__ == "__main__":
         if args.breed:
             # Match single breed
             result = matcher.match_breed(args.breed, user_needs, equal_weights=args.equal_weights)
-            print(f"Breed: {result.breed_id}")
+            print(f"Breed: {result.object_id}")
             print(f"Score: {result.score}")
             print(f"Equal weights: {args.equal_weights}")
             print("\nDetails:")
@@ -555,7 +691,7 @@ if __name__ == "__main__":
             mode = "equal" if args.equal_weights else "weighted"
             print(f"Top {args.top} matches ({mode} mode):\n")
             for i, r in enumerate(results, 1):
-                print(f"{i:2}. {r.breed_id}: {r.score:.3f}")
+                print(f"{i:2}. {r.object_id}: {r.score:.3f}")
 
     else:
         print(f"Loaded {len(matcher.breeds)} breeds, {len(matcher.needs)} needs")
@@ -5,8 +5,10 @@ Represents user as a vector in needs space using 4-valued fuzzy logic (fuzzy4).
 """
 
 import json
+from collections.abc import Iterable, Iterator, Mapping
 from pathlib import Path
 from dataclasses import dataclass, field
+from types import MappingProxyType
 from typing import Any
 
 from fuzzy4 import FuzzyBool
@@ -21,7 +23,12 @@ DEFAULT_ANSWER_OPTIONS = {
 }
 
 
-@dataclass
+def _need_confidence(val: FuzzyBool) -> float:
+    """Confidence of a need value: 1 - unknown = 1 - (1-t)(1-f)."""
+    return 1.0 - (1.0 - val.t) * (1.0 - val.f)
+
+
+@dataclass(slots=True, frozen=True)
 class Answer:
     """Record of a single user answer."""
     need_id: str
@@ -49,8 +56,7 @@ class UserProfile:
 
         # Load config if domain_dir provided
         if self.domain_dir and (self.domain_dir / "config.json").exists():
-            with open(self.domain_dir / "config.json", "r", encoding="utf-8") as f:
-                self.config = json.load(f)
+            self.config = json.loads((self.domain_dir / "config.json").read_bytes())
             self.answer_options = self.config.get("questions", {}).get("answer_options", DEFAULT_ANSWER_OPTIONS)
         else:
             self.config = {}
@@ -63,6 +69,12 @@ class UserProfile:
         self._answer_counts: dict[str, int] = {}  # how many times each need was answered
         self._asked_questions: set[str] = set()  # question_ids that have been asked
         self._need_weights: dict[str, float] = {}  # accumulated weight per need
+        self._confidence: dict[str, float] = {}  # need_id -> 1 - unknown, kept in step with _needs
+
+        # Incremental mirrors for the per-question UI loop
+        self._answered_ids: set[str] = set()  # _needs keys | _independent
+        self._answered_view: frozenset[str] | None = None  # cached snapshot of _answered_ids
+        self._asked_view: frozenset[str] | None = None  # cached snapshot of _asked_questions
 
     def add_answer(
         self,
@@ -86,8 +98,14 @@ class UserProfile:
             raise ValueError(f"Invalid answer_type: {answer_type}. Must be one of {list(self.answer_options.keys())}")
 
         # Mark question as asked
-        if question_id:
+        if question_id and question_id not in self._asked_questions:
             self._asked_questions.add(question_id)
+            self._asked_view = None
+
+        # Set or independent, the need now counts as answered
+        if need_id not in self._answered_ids:
+            self._answered_ids.add(need_id)
+            self._answered_view = None
 
         option = self.answer_options[answer_type]
         mapping = option.get("fuzzy_mapping")
@@ -99,6 +117,7 @@ class UserProfile:
             # Remove from active needs if was set
             self._needs.pop(need_id, None)
             self._need_weights.pop(need_id, None)
+            self._confidence.pop(need_id, None)
         else:
             # Apply weight to T and F values
             # Weight acts as confidence: lower weight = less certain answer
@@ -142,14 +161,20 @@ class UserProfile:
             self._needs[need_id] = old + new_value
             self._need_weights[need_id] += weight
 
+        self._confidence[need_id] = _need_confidence(self._needs[need_id])
         self._answer_counts[need_id] = self._answer_counts.get(need_id, 0) + 1
 
-    def get_needs(self) -> dict[str, FuzzyBool]:
+    def get_needs(self) -> Mapping[str, FuzzyBool]:
         """
         Get current needs vector for matching.
 
-        Returns only needs that are set (not independent, not unset).
+        Returns only needs that are set (not independent, not unset), as a
+        read-only live view; use get_needs_copy() for a snapshot.
         """
+        return MappingProxyType(self._needs)
+
+    def get_needs_copy(self) -> dict[str, FuzzyBool]:
+        """Get a mutable snapshot of the current needs vector."""
         return dict(self._needs)
 
     def get_need(self, need_id: str) -> FuzzyBool | None:
@@ -180,6 +205,10 @@ class UserProfile:
         self._answer_counts.clear()
         self._asked_questions.clear()
         self._need_weights.clear()
+        self._confidence.clear()
+        self._answered_ids.clear()
+        self._answered_view = None
+        self._asked_view = None
 
     def recompute_vector(self) -> None:
         """
@@ -192,16 +221,22 @@ class UserProfile:
         self._answer_counts.clear()
         self._asked_questions.clear()
         self._need_weights.clear()
+        self._confidence.clear()
+        self._answered_ids.clear()
+        self._answered_view = None
+        self._asked_view = None
 
         for ans in self._answers:
             if ans.question_id:
                 self._asked_questions.add(ans.question_id)
+            self._answered_ids.add(ans.need_id)
 
             if ans.fuzzy_value is None:
                 # Independent
                 self._independent.add(ans.need_id)
                 self._needs.pop(ans.need_id, None)
                 self._need_weights.pop(ans.need_id, None)
+                self._confidence.pop(ans.need_id, None)
             else:
                 self._independent.discard(ans.need_id)
                 self._update_need(ans.need_id, ans.fuzzy_value, ans.weight)
@@ -232,11 +267,13 @@ class UserProfile:
         profile = cls(domain_dir)
 
         for need_id, val in data.get("needs", {}).items():
-            profile._needs[need_id] = FuzzyBool(val["t"], val["f"])
+            profile._needs[need_id] = fb = FuzzyBool(val["t"], val["f"])
+            profile._confidence[need_id] = _need_confidence(fb)
 
         profile._need_weights = dict(data.get("need_weights", {}))
         profile._independent = set(data.get("independent", []))
         profile._asked_questions = set(data.get("asked_questions", []))
+        profile._answered_ids = set(profile._needs) | profile._independent
 
         for ans in data.get("answers", []):
             fv = ans.get("fuzzy_value")
@@ -256,17 +293,24 @@ class UserProfile:
 
         return profile
 
-    def get_answered_need_ids(self) -> set[str]:
-        """Get set of all need IDs that have been answered (including independent)."""
-        return set(self._needs.keys()) | self._independent
+    def get_answered_need_ids(self) -> frozenset[str]:
+        """Get all need IDs that have been answered (including independent).
+
+        Returns a read-only snapshot, rebuilt only after a new need is answered.
+        """
+        if self._answered_view is None:
+            self._answered_view = frozenset(self._answered_ids)
+        return self._answered_view
 
     def is_question_asked(self, question_id: str) -> bool:
         """Check if a specific question variant has been asked."""
         return question_id in self._asked_questions
 
-    def get_asked_questions(self) -> set[str]:
-        """Get set of all asked question IDs."""
-        return set(self._asked_questions)
+    def get_asked_questions(self) -> frozenset[str]:
+        """Get all asked question IDs (read-only snapshot, rebuilt only after a new question)."""
+        if self._asked_view is None:
+            self._asked_view = frozenset(self._asked_questions)
+        return self._asked_view
 
     def get_need_confidence(self, need_id: str) -> float:
         """
@@ -278,11 +322,7 @@ class UserProfile:
 
         Returns 0.0 if need not set.
         """
-        val = self._needs.get(need_id)
-        if val is None:
-            return 0.0
-        # confidence = 1 - unknown = 1 - (1-t)(1-f)
-        return 1.0 - (1.0 - val.t) * (1.0 - val.f)
+        return self._confidence.get(need_id, 0.0)
 
     def get_need_total_weight(self, need_id: str) -> float:
         """Get total weight of all questions answered for this need."""
@@ -299,7 +339,17 @@ class UserProfile:
         Returns:
             List of question dicts that haven't been asked
         """
-        return [q for q in all_questions if q.get("id") not in self._asked_questions]
+        return list(self.iter_unanswered_questions(need_id, all_questions))
+
+    def iter_unanswered_questions(self, need_id: str, all_questions: Iterable[dict]) -> Iterator[dict]:
+        """
+        Lazily yield questions for a need that haven't been asked yet.
+
+        Use next(profile.iter_unanswered_questions(...), None) when only the
+        next question is needed, without building the whole list.
+        """
+        asked = self._asked_questions
+        return (q for q in all_questions if q.get("id") not in asked)
 
     def __repr__(self) -> str:
         return f"UserProfile(needs={len(self._needs)}, independent={len(self._independent)}, answers={len(self._answers)})"
@@ -0,0 +1,29 @@
+from fuzzy4 import FuzzyBool
+
+from core.engine.matcher import BreedMatcher, match
+
+
+def test_match_all_fills_details_by_default():
+    matcher = BreedMatcher()
+    user_needs = {"hypoallergenic": FuzzyBool(1, 0), "low_barking": FuzzyBool(0.8, 0.1)}
+
+    results = matcher.match_all(user_needs, top_k=3)
+
+    assert results[0].details
+    assert set(results[0].details) == set(user_needs)
+
+
+def test_match_all_scores_without_details_match_fast():
+    matcher = BreedMatcher()
+    user_needs = {"hypoallergenic": FuzzyBool(1, 0), "low_barking": FuzzyBool(0.8, 0.1)}
+
+    results = matcher.match_all(user_needs, include_details=False)
+
+    assert all(not r.details for r in results)
+    assert [(r.object_id, r.score) for r in results] == matcher.match_fast(user_needs)
+
+
+def test_match_returns_details():
+    results = match({"hypoallergenic": (1, 0)}, top_k=1)
+
+    assert results[0].details["hypoallergenic"]["user"]["score"] == 1